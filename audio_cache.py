@@ -0,0 +1,128 @@
+"""
+Content-addressed cache of synthesized speech.
+
+Entries are keyed on the normalized text, language and voice, stored as
+files under the audio folder and evicted least-recently-used once the cache
+grows past its byte budget. The pipeline caches whole transcripts as well as
+individual sentences, so a new page made mostly of known sentences only
+needs the new ones synthesized.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+TTS_CACHE_MAX_BYTES = int(os.environ.get("TTS_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+
+
+def normalize_text(text):
+    """Case- and whitespace-insensitive form of the text used for cache keys"""
+    return ' '.join(text.split()).lower()
+
+
+class AudioCache:
+    """Thread-safe, disk-size-bounded LRU cache of audio files"""
+
+    def __init__(self, folder, max_bytes=TTS_CACHE_MAX_BYTES, extension="mp3"):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.extension = extension
+        self._entries = OrderedDict()  # key -> size in bytes, least recently used first
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(folder, exist_ok=True)
+        self._load_existing()
+
+    def _load_existing(self):
+        """Rebuild the index from files left by a previous run, oldest access first"""
+        suffix = "." + self.extension
+        files = []
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(suffix):
+                    stat = entry.stat()
+                    files.append((stat.st_atime, entry.name[:-len(suffix)], stat.st_size))
+        with self._lock:
+            for _, key, size in sorted(files):
+                self._entries[key] = size
+                self._total_bytes += size
+            self._evict()
+
+    def key(self, text, lang, voice):
+        digest = hashlib.sha1(f"{lang}|{voice}|{normalize_text(text)}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.folder, f"{key}.{self.extension}")
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def get(self, text, lang, voice):
+        """Return the path of the cached audio for this text, or None"""
+        key = self.key(text, lang, voice)
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            path = self._path(key)
+            if not os.path.exists(path):
+                self._total_bytes -= self._entries.pop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return path
+
+    def get_bytes(self, text, lang, voice):
+        """Return the cached audio bytes for this text, or None"""
+        path = self.get(text, lang, voice)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _register(self, key, size):
+        if key in self._entries:
+            self._total_bytes -= self._entries.pop(key)
+        self._entries[key] = size
+        self._total_bytes += size
+        self._evict()
+
+    def put_bytes(self, text, lang, voice, data):
+        """Store audio bytes for this text and return the cache path"""
+        key = self.key(text, lang, voice)
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._register(key, len(data))
+        return path
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
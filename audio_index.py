@@ -0,0 +1,85 @@
+"""
+In-memory index of generated audio files.
+
+Replaces globbing and sorting the whole audio folder on every "latest
+audio" request. The index is built once at startup from a single directory
+scan and then updated as the pipeline finishes each file, so looking up the
+newest file overall or for a particular device is O(1).
+
+When several server processes share state, the latest entries are also
+written to the shared backend so every process answers the same way.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+AUDIO_EXTENSIONS = (".mp3", ".wav")
+AUDIO_INDEX_RECENT = 256  # recent files remembered as fallbacks when the newest is deleted
+
+
+class AudioIndex:
+    """Newest-first index of audio files, overall and per device"""
+
+    def __init__(self, folder, extensions=AUDIO_EXTENSIONS, recent=AUDIO_INDEX_RECENT, shared=None):
+        self.folder = folder
+        self.extensions = extensions
+        self.shared = shared
+        self._recent = deque(maxlen=recent)  # (mtime, path), newest on the right
+        self._latest_by_device = {}          # device_id -> (mtime, path)
+        self._lock = threading.Lock()
+        self.rebuild()
+
+    def rebuild(self):
+        """Rescan the folder once; subdirectories such as the TTS cache are ignored"""
+        files = []
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(self.extensions):
+                    files.append((entry.stat().st_mtime, entry.path))
+        files.sort()
+        with self._lock:
+            self._recent.clear()
+            self._recent.extend(files[-self._recent.maxlen:])
+            self._latest_by_device.clear()
+
+    def add(self, path, device_id=None):
+        """Record a file as the newest audio, optionally attributed to a device"""
+        entry = (time.time(), path)
+        with self._lock:
+            self._recent.append(entry)
+            if device_id is not None:
+                self._latest_by_device[device_id] = entry
+        if self.shared is not None:
+            self.shared.set_value("latest_audio", path)
+            if device_id is not None:
+                self.shared.set_value(f"latest_audio:{device_id}", path)
+
+    def latest(self, device_id=None):
+        """Path of the newest audio file (for a device if given), or None"""
+        if self.shared is not None:
+            key = "latest_audio" if device_id is None else f"latest_audio:{device_id}"
+            path = self.shared.get_value(key)
+            if path and os.path.exists(path):
+                return path
+            if device_id is not None:
+                return None
+        with self._lock:
+            if device_id is not None:
+                entry = self._latest_by_device.get(device_id)
+                if entry is None:
+                    return None
+                if os.path.exists(entry[1]):
+                    return entry[1]
+                del self._latest_by_device[device_id]
+                return None
+            # Normally the newest entry exists; only deleted files cost extra checks
+            while self._recent:
+                path = self._recent[-1][1]
+                if os.path.exists(path):
+                    return path
+                self._recent.pop()
+            return None
+
+    def __len__(self):
+        return len(self._recent)
@@ -0,0 +1,323 @@
+"""
+Offline benchmark for the OCR + TTS pipeline.
+
+Renders synthetic SVGA text frames in the style of the ESP32-CAM (motion
+blur, skew, uneven lighting, heavy JPEG compression), runs them through each
+pipeline stage and reports per-stage latency percentiles, pipeline
+throughput and character error rate (CER) against the rendered text.
+
+Runs without network access: speech comes from the "stub" TTS backend, and
+all files are written to a temporary directory. OCR settings are read from
+the usual environment variables (OCR_MODE, TEXT_DETECTION, OCR_EXECUTION,
+...), so two configurations can be compared by running the benchmark twice:
+
+    python benchmark.py --frames 50 --output before.json
+    OCR_MODE=all python benchmark.py --frames 50 --output after.json --baseline before.json
+
+Note that --jpeg-quality uses PIL's 1-100 scale, where 10 is very lossy. The
+ESP32 camera's jpeg_quality=10 is on an inverted 0-63 scale, so the default
+here is a worst case.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+FRAME_SIZE = (800, 600)  # SVGA, as configured on the ESP32-CAM
+
+WORDS = (
+    "the quick brown fox jumps over lazy dog menu price coffee tea exit door open "
+    "closed push pull caution wet floor platform train ticket office room floor "
+    "page chapter reading light glasses camera speech text image signal station "
+    "medicine twice daily after meals store below keep away from children"
+).split()
+
+# Environment settings recorded with every run so results stay comparable
+RECORDED_SETTINGS = ("OCR_MODE", "OCR_EXECUTION", "OCR_PROCESSES", "TEXT_DETECTION", "OCR_TARGET_TEXT_HEIGHT",
+                     "TESSERACT_LANG", "QUALITY_GATE", "TTS_BACKEND", "TTS_STUB_LATENCY", "TTS_WORKERS")
+
+
+def _load_font(size):
+    for name in ("DejaVuSans.ttf", "LiberationSans-Regular.ttf", "Arial.ttf"):
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:
+        # Pillow < 10.1 has only the fixed bitmap font
+        return ImageFont.load_default()
+
+
+def render_frame(rng, jpeg_quality, max_blur, max_skew, max_lighting):
+    """Render one synthetic capture; returns (jpeg bytes, reference text, distortion parameters)"""
+    width, height = FRAME_SIZE
+    font_size = rng.randint(18, 40)
+    font = _load_font(font_size)
+    background = rng.randint(170, 235)
+    ink = rng.randint(0, 60)
+
+    image = Image.new("L", FRAME_SIZE, background)
+    draw = ImageDraw.Draw(image)
+    lines = []
+    line_count = rng.randint(3, 8)
+    y = rng.randint(20, height // 4)
+    while y + font_size * 2 < height and len(lines) < line_count:
+        words = [rng.choice(WORDS) for _ in range(rng.randint(2, 6))]
+        x = rng.randint(20, width // 6)
+        while len(words) > 1 and draw.textlength(" ".join(words), font=font) + x > width - 20:
+            words.pop()
+        line = " ".join(words)
+        draw.text((x, y), line, fill=ink, font=font)
+        lines.append(line)
+        y += int(font_size * rng.uniform(1.3, 1.8))
+
+    skew = rng.uniform(-max_skew, max_skew)
+    image = image.rotate(skew, resample=Image.BICUBIC, fillcolor=background)
+    blur = rng.uniform(0, max_blur)
+    if blur > 0.1:
+        image = image.filter(ImageFilter.GaussianBlur(blur))
+
+    # Uneven lighting: a linear falloff across the frame plus sensor noise
+    lighting = rng.uniform(0, max_lighting)
+    angle = rng.uniform(0, 2 * np.pi)
+    xs, ys = np.meshgrid(np.linspace(-1, 1, width), np.linspace(-1, 1, height))
+    falloff = 1.0 - lighting * (0.5 + 0.5 * (np.cos(angle) * xs + np.sin(angle) * ys))
+    pixels = np.asarray(image, dtype=np.float32) * falloff
+    pixels += np.random.default_rng(rng.getrandbits(32)).normal(0, 4, pixels.shape)
+    image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).convert("RGB")
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=jpeg_quality)
+    distortion = {"font_size": font_size, "blur": round(blur, 2), "skew": round(skew, 2),
+                  "lighting": round(lighting, 2)}
+    return buffer.getvalue(), " ".join(lines), distortion
+
+
+def edit_distance(a, b):
+    """Levenshtein distance between two strings"""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def character_error_rate(reference, hypothesis):
+    reference = " ".join(reference.split())
+    hypothesis = " ".join(hypothesis.split())
+    if not reference:
+        return 0.0 if not hypothesis else 1.0
+    return edit_distance(reference, hypothesis) / len(reference)
+
+
+def summarize(samples):
+    """Latency distribution in milliseconds"""
+    if not samples:
+        return {"count": 0}
+    values = np.asarray(samples) * 1000.0
+    return {
+        "count": len(samples),
+        "mean_ms": round(float(values.mean()), 2),
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p90_ms": round(float(np.percentile(values, 90)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+        "max_ms": round(float(values.max()), 2),
+    }
+
+
+def timed(samples, fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    samples.append(time.perf_counter() - start)
+    return result
+
+
+def run_stages(pipeline, frames):
+    """Time every stage separately on each frame, one frame at a time"""
+    import cv2
+    from frame_cache import frame_signature
+    from frame_quality import assess_jpeg
+    from ocr_pipeline import decode_image, extract_text_with_info, normalize_text_scale
+    from text_regions import detect_text_regions
+
+    stages = {name: [] for name in ("decode", "quality_gate", "frame_hash", "text_detection", "ocr", "tts")}
+    per_frame = []
+    for index, (jpeg, reference, distortion) in enumerate(frames):
+        image = timed(stages["decode"], decode_image, jpeg)
+        quality = timed(stages["quality_gate"], assess_jpeg, jpeg)
+        timed(stages["frame_hash"], frame_signature, jpeg)
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        timed(stages["text_detection"], lambda: detect_text_regions(normalize_text_scale(gray)[0]))
+        text, info = timed(stages["ocr"], extract_text_with_info, image)
+        if pipeline.is_speakable(text):
+            timed(stages["tts"], pipeline.generate_audio_from_text, text, f"bench_{index:04d}")
+        hypothesis = text if pipeline.is_speakable(text) else ""
+        per_frame.append({
+            "index": index,
+            **distortion,
+            "quality_ok": quality["ok"],
+            "quality_reason": quality["reason"],
+            "sharpness": quality["sharpness"],
+            "cer": round(character_error_rate(reference, hypothesis), 4),
+            "no_text": not hypothesis,
+            "ocr_regions": info.get("ocr_regions"),
+            "ocr_passes": info.get("ocr_passes"),
+            "ocr_scale": info.get("ocr_scale"),
+        })
+    return {name: summarize(samples) for name, samples in stages.items()}, per_frame
+
+
+def run_throughput(pipeline, frames, workers):
+    """Push every frame through the scheduler at once and measure wall-clock throughput"""
+    from job_scheduler import JobScheduler
+
+    # Fresh TTS cache so speech is synthesized again rather than replayed from the stage run
+    pipeline.audio_cache = pipeline.AudioCache(tempfile.mkdtemp(prefix="tts_cache_", dir="."),
+                                               extension=pipeline.tts_backend.chunk_extension)
+    scheduler = JobScheduler(workers=workers, max_queued=len(frames), supersede=False)
+    latencies = []
+    done = threading.Semaphore(0)
+    lock = threading.Lock()
+
+    def job(index, jpeg, submitted):
+        try:
+            pipeline.process_image_complete(f"bench_tp_{index:04d}", jpeg, None, f"bench-{index}")
+        finally:
+            with lock:
+                latencies.append(time.perf_counter() - submitted)
+            done.release()
+
+    start = time.perf_counter()
+    for index, (jpeg, _, _) in enumerate(frames):
+        scheduler.submit(f"bench-{index}", f"bench_tp_{index:04d}.jpg", job, index, jpeg, time.perf_counter())
+    for _ in frames:
+        done.acquire()
+    elapsed = time.perf_counter() - start
+    return {
+        "workers": workers,
+        "frames": len(frames),
+        "wall_seconds": round(elapsed, 3),
+        "frames_per_second": round(len(frames) / elapsed, 3) if elapsed else None,
+        "end_to_end": summarize(latencies),
+        "queue_wait_seconds": scheduler.stats()["wait_seconds"],
+    }
+
+
+def compare(results, baseline):
+    """Print p50 latency, throughput and CER changes against an earlier run"""
+    print("\n📊 Compared with baseline")
+    for stage, summary in results["stages"].items():
+        before = baseline.get("stages", {}).get(stage, {}).get("p50_ms")
+        after = summary.get("p50_ms")
+        if before and after is not None:
+            print(f"  {stage:15s} p50 {before:9.2f} ms -> {after:9.2f} ms ({(after - before) / before * 100:+.1f}%)")
+    before = baseline.get("throughput", {}).get("frames_per_second")
+    after = results["throughput"]["frames_per_second"]
+    if before and after:
+        print(f"  {'throughput':15s} {before:9.3f} f/s -> {after:9.3f} f/s ({(after - before) / before * 100:+.1f}%)")
+    before = baseline.get("accuracy", {}).get("cer_mean")
+    after = results["accuracy"]["cer_mean"]
+    if before is not None:
+        print(f"  {'CER':15s} {before:9.4f}     -> {after:9.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline OCR + TTS pipeline benchmark")
+    parser.add_argument("--frames", type=int, default=30, help="number of synthetic frames")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for frame rendering")
+    parser.add_argument("--jpeg-quality", type=int, default=10, help="PIL JPEG quality (1-100)")
+    parser.add_argument("--max-blur", type=float, default=1.5, help="maximum Gaussian blur radius")
+    parser.add_argument("--max-skew", type=float, default=4.0, help="maximum rotation in degrees")
+    parser.add_argument("--max-lighting", type=float, default=0.5, help="maximum lighting falloff (0-1)")
+    parser.add_argument("--workers", type=int, default=None, help="scheduler workers for the throughput run")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    repo = os.path.dirname(os.path.abspath(__file__))
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    # Offline, single-process and isolated from the real upload/audio folders
+    os.environ.setdefault("TTS_BACKEND", "stub")
+    os.environ["SAVE_UPLOADS"] = "0"
+    os.environ["SHARED_BACKEND"] = "none"
+    os.environ["RESULT_STORE"] = "memory"
+    workdir = tempfile.mkdtemp(prefix="smartglass_bench_")
+    os.chdir(workdir)
+    sys.path.insert(0, repo)
+    import main as pipeline
+
+    print(f"🖼 Rendering {args.frames} synthetic frames (seed {args.seed})...")
+    rng = random.Random(args.seed)
+    frames = [render_frame(rng, args.jpeg_quality, args.max_blur, args.max_skew, args.max_lighting)
+              for _ in range(args.frames)]
+
+    print("⏱ Timing pipeline stages...")
+    stages, per_frame = run_stages(pipeline, frames)
+    print("🚀 Measuring scheduler throughput...")
+    throughput = run_throughput(pipeline, frames, args.workers or pipeline.scheduler.workers)
+
+    cers = [frame["cer"] for frame in per_frame]
+    results = {
+        "timestamp": datetime.now().isoformat(),
+        "platform": {"python": platform.python_version(), "machine": platform.machine(),
+                     "cpus": os.cpu_count()},
+        "config": {
+            "frames": args.frames, "seed": args.seed, "jpeg_quality": args.jpeg_quality,
+            "max_blur": args.max_blur, "max_skew": args.max_skew, "max_lighting": args.max_lighting,
+            "settings": {name: os.environ.get(name) for name in RECORDED_SETTINGS},
+        },
+        "stages": stages,
+        "throughput": throughput,
+        "accuracy": {
+            "cer_mean": round(float(np.mean(cers)), 4),
+            "cer_p50": round(float(np.percentile(cers, 50)), 4),
+            "cer_p90": round(float(np.percentile(cers, 90)), 4),
+            "no_text_frames": sum(1 for frame in per_frame if frame["no_text"]),
+            "quality_rejected": sum(1 for frame in per_frame if not frame["quality_ok"]),
+        },
+        "frames": per_frame,
+    }
+
+    print("\n⏱ Per-stage latency (ms)")
+    for stage, summary in stages.items():
+        if summary["count"]:
+            print(f"  {stage:15s} p50 {summary['p50_ms']:9.2f}  p90 {summary['p90_ms']:9.2f}  "
+                  f"p99 {summary['p99_ms']:9.2f}  (n={summary['count']})")
+    print(f"\n🚀 Throughput: {throughput['frames_per_second']} frames/s with {throughput['workers']} workers")
+    print(f"🎯 CER: mean {results['accuracy']['cer_mean']}, p90 {results['accuracy']['cer_p90']}")
+
+    if baseline:
+        compare(results, baseline)
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Results written to {output}")
+
+    pipeline.tts_executor.shutdown(wait=False)
+    if pipeline.ocr_process_pool is not None:
+        pipeline.ocr_process_pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+"""
+Fleet load generator: simulate many pairs of glasses against /upload.
+
+Each simulated device behaves like the ESP32 firmware. A button press
+uploads one JPEG as a multipart POST, with no new press while an upload is
+in flight and a cooldown between presses. The device then waits for the
+result and downloads the audio from /audio/<file>. The tool measures
+upload-to-audio-ready latency, error and rejection rates and server queue
+statistics, for a series of fleet sizes, and reports the size at which the
+server saturates.
+
+The app runs in-process (default, offline, stub TTS) or is reached over
+HTTP with --url:
+
+    python fleet_load.py --devices 1,2,4,8,16 --duration 30
+    python fleet_load.py --url http://127.0.0.1:8000 --devices 4,8 --arrival poisson --interval 5
+
+Frames are synthetic SVGA captures rendered up front by benchmark.py, so
+frame rendering does not compete with the server for CPU. Every upload is a
+different frame and the in-process server runs with its frame cache off,
+so each capture goes through OCR and TTS. --frame-pool N instead draws from
+N frames with the frame cache on, to measure a fleet that repeats scenes.
+A server reached with --url controls its own frame cache: start it with
+FRAME_CACHE_SIZE=0 for a capacity test; cache hits seen in responses are
+reported per stage.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+
+import httpx
+
+from benchmark import render_frame, summarize
+
+# Firmware behaviour (ESP32 Cam Code.ino)
+BUTTON_COOLDOWN = 1.0  # seconds between uploads
+RESULT_POLL_INTERVAL = 0.5
+
+# Terminal job states (result_events.TERMINAL_STATES)
+TERMINAL_STATES = {"completed", "ocr_only", "error", "cancelled", "rejected"}
+
+ARRIVAL_PATTERNS = ("steady", "poisson", "burst")
+FETCH_MODES = ("poll", "long-poll", "one-shot")
+
+
+class FleetStats:
+    """Outcomes of every simulated capture in one stage"""
+
+    def __init__(self):
+        self.latencies = []      # upload start -> audio downloaded, seconds
+        self.upload_times = []   # upload request round trip, seconds
+        self.outcomes = Counter()
+        self.audio_bytes = 0
+        self.cache_hits = 0
+
+    def report(self, devices, duration, queue_stats):
+        captures = sum(self.outcomes.values())
+        # Busy (429) and quality rejections (422) are reported separately
+        handled = ("audio", "no_text", "busy", "rejected")
+        failed = captures - sum(self.outcomes[outcome] for outcome in handled)
+        return {
+            "devices": devices,
+            "duration_seconds": duration,
+            "captures": captures,
+            "captures_per_second": round(captures / duration, 3) if duration else None,
+            "audio_per_second": round(self.outcomes["audio"] / duration, 3) if duration else None,
+            "outcomes": dict(self.outcomes),
+            "error_rate": round(failed / captures, 4) if captures else 0.0,
+            "busy_rate": round(self.outcomes["busy"] / captures, 4) if captures else 0.0,
+            "upload_to_audio": summarize(self.latencies),
+            "upload_request": summarize(self.upload_times),
+            "audio_bytes": self.audio_bytes,
+            "frame_cache_hits": self.cache_hits,
+            "queue": queue_stats,
+        }
+
+
+async def next_press(rng, arrival, interval, start, press):
+    """Sleep until the next button press according to the arrival pattern"""
+    if arrival == "burst":
+        # Whole fleet presses together, once per interval
+        target = start + press * interval
+        await asyncio.sleep(max(0.0, target - time.perf_counter()))
+    elif arrival == "poisson":
+        await asyncio.sleep(rng.expovariate(1.0 / interval))
+    else:
+        await asyncio.sleep(interval * rng.uniform(0.8, 1.2))
+
+
+async def wait_for_audio(client, filename, fetch, deadline):
+    """Follow a queued upload to its final result the way the device would"""
+    while True:
+        if fetch == "long-poll":
+            wait = max(1, int(deadline - time.perf_counter()))
+            response = await client.get(f"/processing-result/{filename}", params={"wait": wait})
+        else:
+            response = await client.get(f"/processing-result/{filename}")
+        result = response.json()
+        if result.get("status") in TERMINAL_STATES or result.get("status") == "not_found":
+            return result
+        if time.perf_counter() > deadline:
+            return {"status": "timeout"}
+        if fetch == "poll":
+            await asyncio.sleep(RESULT_POLL_INTERVAL)
+
+
+async def capture(client, device_id, frame, fetch, timeout, stats):
+    """One button press: upload, wait for the result and download the audio"""
+    headers = {"X-Device-ID": device_id}
+    files = {"file": (f"{device_id}.jpg", frame, "image/jpeg")}
+    params = {"respond": "audio"} if fetch == "one-shot" else {}
+    start = time.perf_counter()
+    try:
+        response = await client.post("/upload", files=files, headers=headers, params=params)
+        stats.upload_times.append(time.perf_counter() - start)
+        if response.status_code == 429:
+            stats.outcomes["busy"] += 1
+            return float(response.headers.get("Retry-After", BUTTON_COOLDOWN))
+        if response.status_code == 422:
+            stats.outcomes["rejected"] += 1
+            return 0.0
+
+        if fetch == "one-shot":
+            if response.headers.get("content-type", "").startswith("audio/"):
+                stats.audio_bytes += len(response.content)
+                stats.latencies.append(time.perf_counter() - start)
+                stats.outcomes["audio"] += 1
+            else:
+                result = response.json()
+                stats.cache_hits += bool(result.get("cache_hit"))
+                outcome = {"ocr_only": "no_text", "processing": "timeout"}.get(result.get("processing_status"))
+                stats.outcomes[outcome or result.get("processing_status") or "error"] += 1
+            return 0.0
+
+        body = response.json()
+        if response.status_code >= 400 or "filename" not in body:
+            stats.outcomes["error"] += 1
+            return 0.0
+        filename = body["filename"]
+        if body.get("cache_hit"):
+            stats.cache_hits += 1
+        if body.get("processing_status") == "completed":
+            result = {"status": "completed", "audio_filename": body.get("audio_filename")}
+        else:
+            result = await wait_for_audio(client, filename, fetch, start + timeout)
+        status = result.get("status")
+        if status == "completed":
+            audio_filename = result.get("audio_filename") or os.path.basename(result.get("audio_path", ""))
+            audio = await client.get(f"/audio/{audio_filename}")
+            if audio.headers.get("content-type", "").startswith("audio/"):
+                stats.audio_bytes += len(audio.content)
+                stats.latencies.append(time.perf_counter() - start)
+                stats.outcomes["audio"] += 1
+            else:
+                stats.outcomes["audio_missing"] += 1
+        elif status == "ocr_only":
+            stats.outcomes["no_text"] += 1
+        else:
+            stats.outcomes[status or "error"] += 1
+    except httpx.HTTPError:
+        stats.outcomes["transport_error"] += 1
+    return 0.0
+
+
+class FramePool:
+    """
+    Frames for the simulated uploads. With `size` set, frames are drawn at
+    random from that many; otherwise each upload gets a new frame, taken
+    from those rendered up front and rendered on demand once they run out.
+    """
+
+    def __init__(self, rng, jpeg_quality, size=0, prerender=0):
+        self.rng = rng
+        self.jpeg_quality = jpeg_quality
+        self.size = size
+        self.frames = [self._render() for _ in range(size or prerender)]
+        self.rendered_on_demand = 0
+
+    def _render(self):
+        return render_frame(self.rng, self.jpeg_quality, 1.0, 3.0, 0.4)[0]
+
+    async def take(self, rng):
+        if self.size:
+            return rng.choice(self.frames)
+        if self.frames:
+            return self.frames.pop()
+        self.rendered_on_demand += 1
+        return await asyncio.get_running_loop().run_in_executor(None, self._render)
+
+
+def expected_captures(args):
+    """Upper estimate of the uploads a whole run makes, for pre-rendering unique frames"""
+    press_interval = max(BUTTON_COOLDOWN, args.interval * 0.8)
+    return sum(devices * (int(args.duration / press_interval) + 2) for devices in args.devices)
+
+
+async def device(client, index, frames, args, stop_at, stats):
+    """Press the button until the stage ends, never overlapping uploads"""
+    rng = random.Random(args.seed * 1000 + index)
+    device_id = f"glasses-{index:03d}"
+    start = time.perf_counter()
+    press = 0
+    last_upload = 0.0
+    while True:
+        press += 1
+        await next_press(rng, args.arrival, args.interval, start, press)
+        # Firmware ignores presses within the cooldown of the last upload
+        await asyncio.sleep(max(0.0, last_upload + BUTTON_COOLDOWN - time.perf_counter()))
+        if time.perf_counter() >= stop_at:
+            return
+        last_upload = time.perf_counter()
+        frame = await frames.take(rng)
+        backoff = await capture(client, device_id, frame, args.fetch, args.timeout, stats)
+        if backoff:
+            await asyncio.sleep(backoff)
+
+
+async def run_stage(client, devices, frames, args):
+    stats = FleetStats()
+    start = time.perf_counter()
+    stop_at = start + args.duration
+    await asyncio.gather(*(device(client, i, frames, args, stop_at, stats) for i in range(devices)))
+    elapsed = time.perf_counter() - start
+    try:
+        queue_stats = (await client.get("/queue-stats")).json()
+    except httpx.HTTPError:
+        queue_stats = None
+    return stats.report(devices, round(elapsed, 2), queue_stats)
+
+
+def find_saturation(stages, slo, max_error_rate):
+    """First fleet size that breaks the latency SLO or error budget, or stops adding throughput"""
+    previous = None
+    for stage in stages:
+        p90 = stage["upload_to_audio"].get("p90_ms")
+        if stage["error_rate"] > max_error_rate:
+            return {"devices": stage["devices"], "reason": f"error rate {stage['error_rate']:.1%}"}
+        if stage["busy_rate"] > max_error_rate:
+            return {"devices": stage["devices"], "reason": f"queue full for {stage['busy_rate']:.1%} of uploads"}
+        if p90 is not None and p90 / 1000.0 > slo:
+            return {"devices": stage["devices"], "reason": f"p90 latency {p90 / 1000.0:.2f}s > {slo}s"}
+        if previous and previous["audio_per_second"] and stage["audio_per_second"] is not None:
+            if stage["audio_per_second"] < previous["audio_per_second"] * 1.05:
+                return {"devices": stage["devices"], "reason": "throughput stopped growing"}
+        previous = stage
+    return None
+
+
+def in_process_client(args):
+    """AsyncClient wired straight to the ASGI app, offline and isolated"""
+    os.environ.setdefault("TTS_BACKEND", "stub")
+    os.environ["SAVE_UPLOADS"] = "0"
+    os.environ["SHARED_BACKEND"] = "none"
+    os.environ["RESULT_STORE"] = "memory"
+    # Repeated frames would be answered from the frame cache without OCR
+    if not args.frame_pool:
+        os.environ["FRAME_CACHE_SIZE"] = "0"
+    os.chdir(tempfile.mkdtemp(prefix="smartglass_load_"))
+    import main as server
+    transport = httpx.ASGITransport(app=server.app)
+    return httpx.AsyncClient(transport=transport, base_url="http://glasses.test", timeout=args.timeout)
+
+
+async def run(args):
+    count = args.frame_pool or expected_captures(args)
+    print(f"🖼 Rendering {count} synthetic frames...")
+    frames = FramePool(random.Random(args.seed), args.jpeg_quality, args.frame_pool, count)
+
+    if args.url:
+        if not args.frame_pool:
+            print("⚠ The server's frame cache is not controlled from here; run it with FRAME_CACHE_SIZE=0 "
+                  "so repeated captures cannot skip the pipeline")
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+    else:
+        client = in_process_client(args)
+
+    stages = []
+    async with client:
+        for devices in args.devices:
+            print(f"🚦 {devices} device(s) for {args.duration}s ({args.arrival}, every ~{args.interval}s)...")
+            stage = await run_stage(client, devices, frames, args)
+            latency = stage["upload_to_audio"]
+            print(f"   {stage['captures']} captures, {stage['audio_per_second']} audio/s, "
+                  f"p50 {latency.get('p50_ms')} ms, p90 {latency.get('p90_ms')} ms, "
+                  f"errors {stage['error_rate']:.1%}, busy {stage['busy_rate']:.1%}")
+            if stage["frame_cache_hits"] and not args.frame_pool:
+                print(f"   ⚠ {stage['frame_cache_hits']} captures were frame-cache hits; "
+                      f"latencies understate the pipeline")
+            stages.append(stage)
+            if args.cooldown:
+                await asyncio.sleep(args.cooldown)
+
+    saturation = find_saturation(stages, args.slo, args.max_error_rate)
+    if saturation:
+        print(f"\n📈 Saturated at {saturation['devices']} devices: {saturation['reason']}")
+    else:
+        print(f"\n📈 No saturation up to {args.devices[-1]} devices")
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "target": args.url or "in-process",
+        "config": {
+            "arrival": args.arrival, "interval": args.interval, "fetch": args.fetch,
+            "duration": args.duration, "timeout": args.timeout, "slo_seconds": args.slo,
+            "frame_pool": args.frame_pool, "jpeg_quality": args.jpeg_quality, "seed": args.seed,
+        },
+        "frames_rendered_on_demand": frames.rendered_on_demand,
+        "stages": stages,
+        "saturation": saturation,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate a fleet of glasses against the upload API")
+    parser.add_argument("--url", help="server base URL; the app runs in-process when omitted")
+    parser.add_argument("--devices", default="1,2,4,8",
+                        type=lambda value: [int(n) for n in value.split(",")],
+                        help="comma-separated fleet sizes, run in turn")
+    parser.add_argument("--duration", type=float, default=20, help="seconds per fleet size")
+    parser.add_argument("--arrival", choices=ARRIVAL_PATTERNS, default="steady",
+                        help="button-press pattern per device")
+    parser.add_argument("--interval", type=float, default=4.0, help="mean seconds between presses per device")
+    parser.add_argument("--fetch", choices=FETCH_MODES, default="poll",
+                        help="how devices wait for audio: poll, long-poll (?wait=) or one-shot (?respond=audio)")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds before a capture counts as timed out")
+    parser.add_argument("--slo", type=float, default=5.0, help="p90 upload-to-audio target in seconds")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="error budget per stage")
+    parser.add_argument("--cooldown", type=float, default=2.0, help="idle seconds between stages")
+    parser.add_argument("--frame-pool", type=int, default=0,
+                        help="draw uploads from this many frames with the frame cache on; "
+                             "0 (default) uploads a new frame every time with the cache off")
+    parser.add_argument("--jpeg-quality", type=int, default=60, help="PIL JPEG quality of the frames")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    results = asyncio.run(run(args))
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Perceptual-hash cache for repeated captures.
+
+Users often press the capture button several times while pointing at the
+same page. Frames are keyed by a 64-bit difference hash (dHash) so that
+near-identical captures, whose JPEG bytes differ, still map to the same
+stored transcript and audio file.
+
+A 9x8 hash only sees the layout of a page, so two pages set the same way
+hash alike. Every hash match is therefore confirmed against a thumbnail of
+the frame: both are high-pass filtered so that only the glyph texture
+remains, and each tile of one is matched against the same area of the
+other with a small shift search. A recapture of the same page correlates
+well in most tiles despite hand shake; a different page does not.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import cv2
+import numpy as np
+
+FRAME_CACHE_SIZE = int(os.environ.get("FRAME_CACHE_SIZE", "128"))
+FRAME_CACHE_TTL = float(os.environ.get("FRAME_CACHE_TTL", "300"))  # seconds
+FRAME_CACHE_MAX_DISTANCE = int(os.environ.get("FRAME_CACHE_MAX_DISTANCE", "10"))  # bits out of 64
+# Median tile correlation a hash match needs to count as the same page
+FRAME_CACHE_MIN_SIMILARITY = float(os.environ.get("FRAME_CACHE_MIN_SIMILARITY", "0.65"))
+
+# Confirmation thumbnail: 1/2-scale SVGA, split into tiles matched with
+# up to _TILE_SHIFT pixels of slack
+THUMBNAIL_SIZE = (400, 300)
+_THUMBNAIL_TILES = (6, 4)
+_TILE_SHIFT = 10
+_HIGH_PASS_SIGMA = 3
+
+FrameSignature = namedtuple("FrameSignature", ("dhash", "thumbnail"))
+
+
+def dhash(gray, hash_size=8):
+    """Difference hash of a grayscale image as a Python int"""
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).tobytes().hex(), 16)
+
+
+def dhash_from_jpeg(data):
+    """
+    Hash an encoded frame without a full-resolution decode.
+
+    IMREAD_REDUCED_GRAYSCALE_8 lets libjpeg decode at 1/8 scale, which is all
+    a 9x8 hash needs. Returns None if the bytes are not a decodable image.
+    """
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    gray = cv2.imdecode(buffer, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if gray is None:
+        return None
+    return dhash(gray)
+
+
+def frame_signature(data):
+    """
+    dHash plus confirmation thumbnail of an encoded frame, from one 1/2-scale
+    decode. Returns None if the bytes are not a decodable image.
+    """
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    gray = cv2.imdecode(buffer, cv2.IMREAD_REDUCED_GRAYSCALE_2)
+    if gray is None:
+        return None
+    thumbnail = cv2.resize(gray, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+    return FrameSignature(dhash(gray), thumbnail)
+
+
+def _high_pass(thumbnail):
+    thumbnail = thumbnail.astype(np.float32)
+    return thumbnail - cv2.GaussianBlur(thumbnail, (0, 0), _HIGH_PASS_SIGMA)
+
+
+def thumbnail_similarity(a, b):
+    """
+    Median over tiles of the best normalized correlation of a tile of `a`
+    with the neighbourhood of the same tile in `b`, from -1 to 1
+    """
+    a, b = _high_pass(a), _high_pass(b)
+    height, width = a.shape
+    columns, rows = _THUMBNAIL_TILES
+    tile_h, tile_w = height // rows, width // columns
+    scores = []
+    for row in range(rows):
+        for column in range(columns):
+            top, left = row * tile_h, column * tile_w
+            tile = a[top + _TILE_SHIFT:top + tile_h - _TILE_SHIFT, left + _TILE_SHIFT:left + tile_w - _TILE_SHIFT]
+            if tile.std() < 1.0:
+                continue  # blank margin, says nothing about the text
+            area = b[max(0, top - _TILE_SHIFT):top + tile_h + _TILE_SHIFT,
+                     max(0, left - _TILE_SHIFT):left + tile_w + _TILE_SHIFT]
+            scores.append(float(cv2.matchTemplate(area, tile, cv2.TM_CCOEFF_NORMED).max()))
+    return float(np.median(scores)) if scores else 0.0
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+class FrameCache:
+    """
+    Thread-safe LRU/TTL cache mapping frame signatures to finished
+    processing results. The dHash finds candidates and the thumbnail
+    confirms them.
+    """
+
+    def __init__(self, max_entries=FRAME_CACHE_SIZE, ttl=FRAME_CACHE_TTL, max_distance=FRAME_CACHE_MAX_DISTANCE,
+                 min_similarity=FRAME_CACHE_MIN_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.min_similarity = min_similarity
+        self._entries = OrderedDict()  # hash -> (stored_at, result, thumbnail)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.rejected_matches = 0
+        self.evictions = 0
+
+    def _expire(self, now):
+        expired = [key for key, (stored_at, _, _) in self._entries.items() if now - stored_at > self.ttl]
+        for key in expired:
+            del self._entries[key]
+        self.evictions += len(expired)
+
+    def _candidates(self, signature):
+        """Entries within the hash distance, closest first; caller holds the lock"""
+        candidates = []
+        for key, (_, result, thumbnail) in self._entries.items():
+            distance = hamming_distance(key, signature.dhash)
+            if distance <= self.max_distance:
+                candidates.append((distance, key, result, thumbnail))
+        candidates.sort(key=lambda candidate: candidate[0])
+        return candidates
+
+    def _confirmed(self, signature):
+        """(distance, key, result, similarity) of the closest confirmed match, or None"""
+        with self._lock:
+            self._expire(time.time())
+            candidates = self._candidates(signature)
+        for distance, key, result, thumbnail in candidates:
+            similarity = thumbnail_similarity(thumbnail, signature.thumbnail)
+            if similarity >= self.min_similarity:
+                return distance, key, result, similarity
+            with self._lock:
+                self.rejected_matches += 1
+        return None
+
+    def get(self, signature):
+        """Return the cached result for a confirmed match of the frame, or None"""
+        if signature is None:
+            return None
+        match = self._confirmed(signature)
+        with self._lock:
+            if match is None:
+                self.misses += 1
+                return None
+            distance, key, result, similarity = match
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(result, cache_distance=distance, cache_similarity=round(similarity, 3))
+
+    def put(self, signature, result):
+        """Store a finished result for a frame, evicting the least recently used entry if full"""
+        if signature is None:
+            return
+        with self._lock:
+            self._entries[signature.dhash] = (time.time(), result, signature.thumbnail)
+            self._entries.move_to_end(signature.dhash)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, signature):
+        """Drop the entry a frame matches, e.g. when its audio file has disappeared"""
+        match = self._confirmed(signature)
+        if match is not None:
+            with self._lock:
+                self._entries.pop(match[1], None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "max_distance": self.max_distance,
+                "min_similarity": self.min_similarity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "rejected_matches": self.rejected_matches,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
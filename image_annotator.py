@@ -6,17 +6,22 @@ import io
 from paddleocr import PaddleOCR
 import pytesseract
 import numpy as np
-import re
 from llm_processor import LLMProcessor
+from llm_spellcheck import SpellChecker, LLM_BATCH, OLLAMA_MODEL
 import cv2
 import logging
 import flask
+import queue
+import threading
+from contextlib import contextmanager
+from metrics import render as render_metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE, stage_seconds
 
 # Create Blueprint
 image_annotator_bp = Blueprint('image_annotator', __name__)
 
 # Initialize processors
 llm_processor = LLMProcessor()
+spell_checker = SpellChecker()
 
 # Configure paths
 UPLOAD_FOLDER = 'temp_images'
@@ -27,11 +32,102 @@ os.makedirs(ANNOTATED_FOLDER, exist_ok=True)
 # Configure logger
 logger = logging.getLogger(__name__)
 
+# PaddleOCR engine pool configuration
+PADDLE_POOL_SIZE = int(os.environ.get('PADDLE_POOL_SIZE', '2'))
+PADDLE_CHECKOUT_TIMEOUT = float(os.environ.get('PADDLE_CHECKOUT_TIMEOUT', '30'))
+
+
+class PaddlePoolTimeout(Exception):
+    """Raised when no PaddleOCR engine becomes free within the checkout timeout"""
+
+
+class PaddleOCRPool:
+    """
+    Process-wide pool of pre-loaded PaddleOCR engines.
+
+    Engines are created and warmed once, then handed out to request handlers
+    through a bounded checkout/checkin API so that each request only pays for
+    inference, never for model loading.
+    """
+
+    def __init__(self, size=PADDLE_POOL_SIZE, checkout_timeout=PADDLE_CHECKOUT_TIMEOUT):
+        self.size = max(1, size)
+        self.checkout_timeout = checkout_timeout
+        self._engines = queue.Queue(maxsize=self.size)
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self):
+        """Load and warm every engine in the pool (idempotent)"""
+        with self._lock:
+            if self._started:
+                return
+            for i in range(self.size):
+                engine = PaddleOCR(use_angle_cls=True, lang='en')
+                self._warm_up(engine)
+                self._engines.put(engine)
+                logger.info(f"PaddleOCR engine {i + 1}/{self.size} loaded and warmed")
+            self._started = True
+
+    @staticmethod
+    def _warm_up(engine):
+        """Run one dummy inference so detection, classification and recognition are initialised"""
+        dummy = Image.new("RGB", (320, 64), "white")
+        ImageDraw.Draw(dummy).text((10, 20), "warm up", fill="black")
+        try:
+            engine.ocr(np.array(dummy))
+        except Exception as e:
+            logger.warning(f"PaddleOCR warm-up inference failed: {str(e)}")
+
+    def checkout(self, timeout=None):
+        """Take an engine out of the pool, waiting up to `timeout` seconds for one to be returned"""
+        self.start()
+        wait = self.checkout_timeout if timeout is None else timeout
+        try:
+            return self._engines.get(timeout=wait)
+        except queue.Empty:
+            raise PaddlePoolTimeout(f"No PaddleOCR engine available after {wait}s")
+
+    def checkin(self, engine):
+        """Return an engine to the pool"""
+        self._engines.put_nowait(engine)
+
+    @contextmanager
+    def engine(self, timeout=None):
+        """Context manager wrapping checkout/checkin"""
+        engine = self.checkout(timeout)
+        try:
+            yield engine
+        finally:
+            self.checkin(engine)
+
+    def available(self):
+        """Number of engines currently idle in the pool"""
+        return self._engines.qsize()
+
+
+paddle_pool = PaddleOCRPool()
+
+
+@image_annotator_bp.record_once
+def _warm_paddle_pool(state):
+    """Load the PaddleOCR engines when the blueprint is registered, before the first request"""
+    global paddle_pool
+    size = state.app.config.get('PADDLE_POOL_SIZE')
+    if size and int(size) != paddle_pool.size:
+        paddle_pool = PaddleOCRPool(size=int(size))
+    paddle_pool.start()
+
 @image_annotator_bp.route('/')
 def index():
     """Render the image annotator page"""
     return render_template('image_annotator.html')
 
+@image_annotator_bp.route('/metrics')
+def metrics():
+    """Stage latencies for the annotator in the Prometheus text format"""
+    return flask.Response(render_metrics(), mimetype=METRICS_CONTENT_TYPE)
+
 @image_annotator_bp.route('/process_image', methods=['POST'])
 def process_image():
     """Process image with OCR and highlight words"""
@@ -55,12 +151,13 @@ def process_image():
         # Process with OCR
         image = Image.open(temp_path).convert("RGB")
         
-        # PaddleOCR
-        ocr = PaddleOCR(use_angle_cls=True, lang='en')
-        paddle_result = ocr.ocr(np.array(image))
+        # PaddleOCR (engine borrowed from the shared pool)
+        with paddle_pool.engine() as ocr, stage_seconds.time(stage="paddle_inference"):
+            paddle_result = ocr.ocr(np.array(image))
         
         # Tesseract
-        tesseract_data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
+        with stage_seconds.time(stage="tesseract"):
+            tesseract_data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
         
         # Create annotated image
         annotated = image.copy()
@@ -106,12 +203,14 @@ def process_image():
             'filename': output_filename
         })
         
+    except PaddlePoolTimeout as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @image_annotator_bp.route('/spell_check_image', methods=['POST'])
 def spell_check_image():
-    """Process image with OCR and check for spelling errors using simple HTTP API for LLM"""
+    """Process image with OCR and check for spelling errors with concurrent LLM calls"""
     try:
         # Check if image was uploaded
         if 'image' not in request.files:
@@ -132,9 +231,11 @@ def spell_check_image():
         all_errors = []
         raw_llm_responses = {}
         
-        # 1. PaddleOCR - Original
-        ocr = PaddleOCR(use_angle_cls=True, lang='en')
-        paddle_result = ocr.ocr(np.array(image))
+        # 1. PaddleOCR - Original and rotated (engine borrowed from the shared pool)
+        rotated_image = np.array(image.rotate(90, expand=True))
+        with paddle_pool.engine() as ocr, stage_seconds.time(stage="paddle_inference"):
+            paddle_result = ocr.ocr(np.array(image))
+            paddle_rotated_result = ocr.ocr(rotated_image)
         
         # Format PaddleOCR results
         paddle_data = []
@@ -156,7 +257,8 @@ def spell_check_image():
         
         # 2. Tesseract OCR - Original
         tesseract_data = []
-        data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
+        with stage_seconds.time(stage="tesseract"):
+            data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
         for i in range(len(data['text'])):
             if data['text'][i].strip():
                 tesseract_data.append({
@@ -170,10 +272,7 @@ def spell_check_image():
                 })
         
         # 3. PaddleOCR - Rotated (90 degrees)
-        rotated_image = np.array(image.rotate(90, expand=True))
-        paddle_rotated_result = ocr.ocr(rotated_image)
-        
-        # Format rotated PaddleOCR results
+        # Format rotated PaddleOCR results (inference already ran above)
         paddle_rotated_data = []
         if paddle_rotated_result and paddle_rotated_result[0]:
             for line in paddle_rotated_result[0]:
@@ -193,7 +292,8 @@ def spell_check_image():
         # 4. Tesseract OCR - Rotated (90 degrees)
         rotated_image_pil = image.rotate(90, expand=True)
         tesseract_rotated_data = []
-        rotated_data = pytesseract.image_to_data(rotated_image_pil, output_type=pytesseract.Output.DICT)
+        with stage_seconds.time(stage="tesseract"):
+            rotated_data = pytesseract.image_to_data(rotated_image_pil, output_type=pytesseract.Output.DICT)
         for i in range(len(rotated_data['text'])):
             if rotated_data['text'][i].strip():
                 tesseract_rotated_data.append({
@@ -206,71 +306,19 @@ def spell_check_image():
                     'method': 'tesseract_rotated'
                 })
         
-        # Process each method separately with LLM if Ollama is available
+        # Spell-check every method with the LLM if Ollama is available; the
+        # calls run concurrently, or as one prompt with ?batch=1
         if llm_processor.ollama_available:
-            for method_name, method_data in [
-                ('paddle_original', paddle_data),
-                ('tesseract_original', tesseract_data),
-                ('paddle_rotated', paddle_rotated_data),
-                ('tesseract_rotated', tesseract_rotated_data)
-            ]:
-                if not method_data:
-                    continue
-                    
-                # Create OCR text for this method only
-                ocr_text = []
-                for item in method_data:
-                    ocr_text.append(f"Text: {item['text']} (at x:{item['x']}, y:{item['y']}, confidence:{item.get('confidence', 0):.2f})")
-                
-                if not ocr_text:
-                    continue
-                
-                # Create prompt for LLM for this method
-                prompt = r"""
-                I have OCR results from an image using the {} method. Please identify any spelling errors.
-                For each error, provide:
-                1. The misspelled word
-                2. The coordinates (x,y)
-                
-                Format each error as: "ERROR: [misspelled word] | COORDINATES: x:[x], y:[y]"
-                
-                Here are the OCR results:
-                {}
-                """.format(method_name, '\n'.join(ocr_text))
-                
-                try:
-                    # Make a direct API call to Ollama
-                    response = requests.post(
-                        'http://localhost:11434/api/generate',
-                        json={
-                            'model': 'mistral-small:24b-instruct-2501-q8_0',
-                            'prompt': prompt,
-                            'stream': False
-                        }
-                    )
-                    
-                    if response.status_code == 200:
-                        raw_response = response.json().get('response', '')
-                        raw_llm_responses[method_name] = raw_response
-                        
-                        # Parse the response to extract errors
-                        pattern = r"ERROR:\s*(\w+)\s*\|\s*COORDINATES:\s*x:(\d+),\s*y:(\d+)"
-                        matches = re.findall(pattern, raw_response)
-                        
-                        for match in matches:
-                            misspelled, x, y = match
-                            all_errors.append({
-                                'word': misspelled,
-                                'coordinates': {
-                                    'x': int(x),
-                                    'y': int(y)
-                                },
-                                'method': method_name
-                            })
-                except Exception as e:
-                    raw_llm_responses[method_name] = f"Error connecting to Ollama: {str(e)}"
+            batch = request.form.get('batch', request.args.get('batch', '1' if LLM_BATCH else '0')) in ('1', 'true')
+            method_errors, raw_llm_responses = spell_checker.check({
+                'paddle_original': paddle_data,
+                'tesseract_original': tesseract_data,
+                'paddle_rotated': paddle_rotated_data,
+                'tesseract_rotated': tesseract_rotated_data
+            }, batch=batch)
+            all_errors.extend(method_errors)
         else:
-            raw_llm_responses['error'] = "Ollama is not available. Please ensure Ollama is running with the mistral-small:24b-instruct-2501-q8_0 model."
+            raw_llm_responses['error'] = f"Ollama is not available. Please ensure Ollama is running with the {OLLAMA_MODEL} model."
         
         # Remove duplicates based on word and approximate coordinates
         unique_errors = []
@@ -294,7 +342,7 @@ def spell_check_image():
         try:
             font = ImageFont.truetype("arial.ttf", 16)
         except Exception as e:
-            print(f"Error loading font: {e}")
+            logger.warning(f"Error loading font: {e}")
             font = ImageFont.load_default()
         
         # Draw errors on image
@@ -322,6 +370,8 @@ def spell_check_image():
             'raw_llm_response': raw_llm_responses
         })
         
+    except PaddlePoolTimeout as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -372,7 +422,7 @@ def _annotate_all_extraction_errors_impl(image_path, extraction_errors, image_in
         try:
             font = ImageFont.truetype("arial.ttf", 20)
         except Exception as e:
-            print(f"Error loading font: {e}")
+            logger.warning(f"Error loading font: {e}")
             font = ImageFont.load_default()
         
         # Dictionary to store all output paths
@@ -0,0 +1,251 @@
+"""
+Bounded, per-device fair job scheduler for the OCR + TTS pipeline.
+
+Every device gets its own FIFO queue and worker threads take jobs from the
+devices in round-robin order, so one chatty pair of glasses cannot starve
+the rest of the fleet. The total number of queued jobs is bounded; when the
+queue is full, submit() raises QueueFull with a Retry-After estimate. A new
+upload from a device supersedes that device's older jobs, which are
+cancelled rather than processed.
+
+Each job runs in a copy of the context it was submitted from, so request
+context such as the trace ID follows it onto the worker thread.
+"""
+import contextvars
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+
+from metrics import queue_wait_seconds
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "3"))
+JOB_QUEUE_LIMIT = int(os.environ.get("JOB_QUEUE_LIMIT", "32"))
+JOB_SUPERSEDE = os.environ.get("JOB_SUPERSEDE", "1") == "1"
+
+# Number of recent queue waits kept for percentile statistics
+_WAIT_SAMPLES = 500
+
+
+def new_job_id(prefix="ESP32"):
+    """Timestamped, collision-free job identifier"""
+    now = datetime.now()
+    return f"{prefix}_{now:%Y%m%d%H%M_%S}_{uuid.uuid4().hex[:8]}"
+
+
+class QueueFull(Exception):
+    """Raised when the scheduler is saturated; retry_after is a hint in seconds"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Job queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class Job:
+    """One unit of pipeline work queued for a device"""
+
+    def __init__(self, job_id, device_id, fn, args):
+        self.job_id = job_id
+        self.device_id = device_id
+        self.fn = fn
+        self.args = args
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.cancelled = threading.Event()
+        self.superseded_by = None
+        self.context = contextvars.copy_context()
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(math.ceil(fraction * len(sorted_values))) - 1)
+    return sorted_values[max(index, 0)]
+
+
+class JobScheduler:
+    """Worker pool fed from per-device queues in round-robin order"""
+
+    def __init__(self, workers=JOB_WORKERS, max_queued=JOB_QUEUE_LIMIT, supersede=JOB_SUPERSEDE, on_cancel=None):
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.supersede = supersede
+        self.on_cancel = on_cancel
+        self._condition = threading.Condition()
+        self._queues = {}         # device_id -> deque of pending jobs
+        self._ring = deque()      # devices with pending jobs, in service order
+        self._jobs = {}           # job_id -> Job, queued or running
+        self._running = {}        # device_id -> set of running job ids
+        self._queued = 0
+        self._waits = deque(maxlen=_WAIT_SAMPLES)
+        self._service_time = None  # exponentially weighted mean, seconds
+        self._threads = []
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.cancelled = 0
+
+    def start(self):
+        """Start the worker threads (idempotent)"""
+        with self._condition:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"pipeline-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def retry_after(self):
+        """Seconds until a queue slot is likely to free up"""
+        service_time = self._service_time or 1.0
+        return max(1, int(math.ceil(service_time * (self._queued + 1) / self.workers)))
+
+    def submit(self, device_id, job_id, fn, *args):
+        """Queue fn(*args) for a device, cancelling its superseded jobs; raises QueueFull when saturated"""
+        self.start()
+        cancelled_jobs = []
+        with self._condition:
+            # The device's own queued jobs would make room when superseded,
+            # but nothing is cancelled until the new job is known to fit
+            freed = len(self._queues.get(device_id, ())) if self.supersede else 0
+            if self._queued - freed >= self.max_queued:
+                self.rejected += 1
+                raise QueueFull(self.retry_after())
+            if self.supersede:
+                cancelled_jobs = self._supersede(device_id, job_id)
+
+            job = Job(job_id, device_id, fn, args)
+            if device_id not in self._queues:
+                self._queues[device_id] = deque()
+                self._ring.append(device_id)
+            self._queues[device_id].append(job)
+            self._jobs[job_id] = job
+            self._queued += 1
+            self.submitted += 1
+            self._condition.notify()
+
+        for cancelled_job in cancelled_jobs:
+            self._notify_cancel(cancelled_job)
+        return job
+
+    def _supersede(self, device_id, new_job_id):
+        """Cancel a device's queued jobs and flag its running ones; caller holds the lock"""
+        superseded = []
+        pending = self._queues.pop(device_id, None)
+        if pending:
+            self._ring.remove(device_id)
+            self._queued -= len(pending)
+            for job in pending:
+                del self._jobs[job.job_id]
+                superseded.append(job)
+        for job_id in self._running.get(device_id, ()):
+            if not self._jobs[job_id].cancelled.is_set():
+                superseded.append(self._jobs[job_id])
+        for job in superseded:
+            job.superseded_by = new_job_id
+            job.cancelled.set()
+        self.cancelled += len(superseded)
+        return superseded
+
+    def _notify_cancel(self, job):
+        if self.on_cancel:
+            try:
+                self.on_cancel(job)
+            except Exception as e:
+                logger.error("Cancel callback failed for %s: %s", job.job_id, e)
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job; returns False if it is unknown or already finished"""
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return False
+            queue = self._queues.get(job.device_id)
+            if job.started_at is None and queue is not None:
+                queue.remove(job)
+                self._queued -= 1
+                del self._jobs[job_id]
+                if not queue:
+                    del self._queues[job.device_id]
+                    self._ring.remove(job.device_id)
+            job.cancelled.set()
+            self.cancelled += 1
+        self._notify_cancel(job)
+        return True
+
+    def is_cancelled(self, job_id):
+        """Whether a running job has been cancelled or superseded since it was queued"""
+        job = self._jobs.get(job_id)
+        return job is not None and job.cancelled.is_set()
+
+    def _next_job(self):
+        with self._condition:
+            while not self._ring:
+                self._condition.wait()
+            device_id = self._ring.popleft()
+            queue = self._queues[device_id]
+            job = queue.popleft()
+            if queue:
+                self._ring.append(device_id)
+            else:
+                del self._queues[device_id]
+            self._queued -= 1
+            job.started_at = time.time()
+            self._running.setdefault(device_id, set()).add(job.job_id)
+            self._waits.append(job.started_at - job.submitted_at)
+        queue_wait_seconds.observe(job.started_at - job.submitted_at)
+        return job
+
+    def _finish(self, job):
+        duration = time.time() - job.started_at
+        with self._condition:
+            self._jobs.pop(job.job_id, None)
+            running = self._running.get(job.device_id)
+            if running is not None:
+                running.discard(job.job_id)
+                if not running:
+                    del self._running[job.device_id]
+            self.completed += 1
+            if self._service_time is None:
+                self._service_time = duration
+            else:
+                self._service_time = 0.8 * self._service_time + 0.2 * duration
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            try:
+                job.context.run(job.fn, *job.args)
+            except Exception as e:
+                logger.error("Job %s failed: %s", job.job_id, e)
+            finally:
+                self._finish(job)
+
+    def stats(self):
+        with self._condition:
+            waits = sorted(self._waits)
+            return {
+                "workers": self.workers,
+                "queue_depth": self._queued,
+                "queue_limit": self.max_queued,
+                "running": sum(len(jobs) for jobs in self._running.values()),
+                "devices_waiting": len(self._ring),
+                "per_device_depth": {device: len(queue) for device, queue in self._queues.items()},
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "cancelled": self.cancelled,
+                "wait_seconds": {
+                    "mean": round(sum(waits) / len(waits), 3) if waits else 0.0,
+                    "p50": round(_percentile(waits, 0.5), 3),
+                    "p95": round(_percentile(waits, 0.95), 3),
+                    "max": round(waits[-1], 3) if waits else 0.0,
+                },
+                "mean_service_seconds": round(self._service_time, 3) if self._service_time else None,
+            }
@@ -0,0 +1,316 @@
+"""
+LLM spell-check of OCR results against an Ollama server.
+
+The annotator reads each image with four OCR methods and asks the model for
+the misspelled words of each one. The calls are issued concurrently from a
+pooled async HTTP client on a background event loop, so a request waits for
+the slowest call rather than the sum of all of them; with LLM_BATCH=1 the
+methods are sent together as a single prompt instead.
+
+Every call has a deadline covering the wait for a pooled connection, the
+connect and the reply; a method that misses it is reported as timed out
+rather than failing the request. After LLM_BREAKER_FAILURES consecutive failures a
+circuit breaker stops calling the server for LLM_BREAKER_RESET seconds and
+then lets a single trial call through. Responses are cached on the model
+name and OCR text, and identical calls in flight are shared, so re-checking
+the same page costs nothing.
+
+OLLAMA_URL points the client at another server, e.g. stub_ollama.py for
+testing without a GPU.
+"""
+import asyncio
+import concurrent.futures
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import httpx
+
+from metrics import Counter, stage_seconds
+
+OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://localhost:11434")
+OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "mistral-small:24b-instruct-2501-q8_0")
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", "60"))                    # seconds per call
+LLM_CONNECT_TIMEOUT = float(os.environ.get("LLM_CONNECT_TIMEOUT", "3"))
+LLM_POOL_TIMEOUT = float(os.environ.get("LLM_POOL_TIMEOUT", "10"))          # waiting for a free connection
+LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", "8"))
+LLM_BATCH = os.environ.get("LLM_BATCH", "0") == "1"                         # one prompt for all methods
+LLM_BREAKER_FAILURES = int(os.environ.get("LLM_BREAKER_FAILURES", "3"))
+LLM_BREAKER_RESET = float(os.environ.get("LLM_BREAKER_RESET", "30"))        # seconds the breaker stays open
+LLM_CACHE_SIZE = int(os.environ.get("LLM_CACHE_SIZE", "256"))               # cached responses
+
+ERROR_PATTERN = re.compile(r"ERROR:\s*(\w+)\s*\|\s*COORDINATES:\s*x:(\d+),\s*y:(\d+)")
+BATCH_ERROR_PATTERN = re.compile(r"ERROR:\s*(\w+)\s*\|\s*METHOD:\s*(\w+)\s*\|\s*COORDINATES:\s*x:(\d+),\s*y:(\d+)")
+
+llm_calls_total = Counter("smartglass_llm_calls_total", "LLM spell-check calls by result", ("result",))
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling the LLM while the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a single half-open trial call"""
+
+    def __init__(self, failures=LLM_BREAKER_FAILURES, reset_after=LLM_BREAKER_RESET):
+        self.failures = failures
+        self.reset_after = reset_after
+        self._consecutive = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half_open" if time.monotonic() - self._opened_at >= self.reset_after else "open"
+
+    def allow(self):
+        """Whether a call may go out now"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.reset_after and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._consecutive = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive += 1
+            if self._trial or self._consecutive >= self.failures:
+                self._opened_at = time.monotonic()
+            self._trial = False
+
+
+def format_ocr_lines(items):
+    """OCR results of one method as the text lines given to the model"""
+    return '\n'.join(
+        f"Text: {item['text']} (at x:{item['x']}, y:{item['y']}, confidence:{item.get('confidence', 0):.2f})"
+        for item in items
+    )
+
+
+def method_prompt(method_name, ocr_text):
+    return r"""
+    I have OCR results from an image using the {} method. Please identify any spelling errors.
+    For each error, provide:
+    1. The misspelled word
+    2. The coordinates (x,y)
+
+    Format each error as: "ERROR: [misspelled word] | COORDINATES: x:[x], y:[y]"
+
+    Here are the OCR results:
+    {}
+    """.format(method_name, ocr_text)
+
+
+def batch_prompt(method_texts):
+    sections = '\n\n'.join(f"### {method_name}\n{ocr_text}" for method_name, ocr_text in method_texts.items())
+    return r"""
+    I have OCR results from one image read by several methods, each under its own ### heading.
+    Please identify any spelling errors in each method's results.
+    For each error, provide:
+    1. The misspelled word
+    2. The method heading it appears under
+    3. The coordinates (x,y)
+
+    Format each error as: "ERROR: [misspelled word] | METHOD: [method] | COORDINATES: x:[x], y:[y]"
+
+    Here are the OCR results:
+    {}
+    """.format(sections)
+
+
+def parse_errors(raw_response, method_name):
+    return [
+        {'word': word, 'coordinates': {'x': int(x), 'y': int(y)}, 'method': method_name}
+        for word, x, y in ERROR_PATTERN.findall(raw_response)
+    ]
+
+
+def parse_batch_errors(raw_response, method_names):
+    return [
+        {'word': word, 'coordinates': {'x': int(x), 'y': int(y)}, 'method': method}
+        for word, method, x, y in BATCH_ERROR_PATTERN.findall(raw_response)
+        if method in method_names
+    ]
+
+
+class SpellChecker:
+    """
+    Thread-safe front end to the Ollama generate API.
+
+    Callers on any thread use `check`; the HTTP client, response cache and
+    in-flight table belong to a private event loop thread started on first
+    use, so they need no locking.
+    """
+
+    def __init__(self, url=OLLAMA_URL, model=OLLAMA_MODEL, timeout=LLM_TIMEOUT,
+                 connect_timeout=LLM_CONNECT_TIMEOUT, pool_timeout=LLM_POOL_TIMEOUT,
+                 max_connections=LLM_MAX_CONNECTIONS, cache_size=LLM_CACHE_SIZE, breaker=None):
+        self.url = url.rstrip('/')
+        self.model = model
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.pool_timeout = pool_timeout
+        self.max_connections = max_connections
+        self.cache_size = cache_size
+        self.breaker = breaker or CircuitBreaker()
+        self._cache = OrderedDict()   # (model, ocr text) -> raw response, least recently used first
+        self._inflight = {}           # (model, ocr text) -> task generating it
+        self._loop = None
+        self._client = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_loop(self):
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="llm-spellcheck", daemon=True).start()
+                self._client = asyncio.run_coroutine_threadsafe(self._create_client(), loop).result()
+                self._loop = loop
+            return self._loop
+
+    async def _create_client(self):
+        return httpx.AsyncClient(
+            base_url=self.url,
+            timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout, pool=self.pool_timeout),
+            limits=httpx.Limits(max_connections=self.max_connections,
+                                max_keepalive_connections=self.max_connections),
+        )
+
+    def close(self):
+        with self._start_lock:
+            if self._loop is None:
+                return
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = self._client = None
+
+    @property
+    def deadline(self):
+        """Seconds one call may take: queued for a connection, connecting, then waiting for the reply"""
+        return self.pool_timeout + self.connect_timeout + self.timeout
+
+    async def _post(self, prompt):
+        if not self.breaker.allow():
+            llm_calls_total.inc(result="circuit_open")
+            raise CircuitOpen(f"LLM circuit open after repeated failures; retrying in up to "
+                              f"{self.breaker.reset_after:.0f}s")
+        try:
+            with stage_seconds.time(stage="llm_call"):
+                response = await self._client.post('/api/generate', json={
+                    'model': self.model,
+                    'prompt': prompt,
+                    'stream': False
+                })
+                response.raise_for_status()
+                raw_response = response.json().get('response', '')
+        except Exception:
+            self.breaker.record_failure()
+            llm_calls_total.inc(result="error")
+            raise
+        self.breaker.record_success()
+        llm_calls_total.inc(result="ok")
+        return raw_response
+
+    async def _generate(self, ocr_text, prompt):
+        """Raw model response for `prompt`, from the cache when the OCR text was seen before"""
+        key = (self.model, ocr_text)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            llm_calls_total.inc(result="cached")
+            return self._cache[key]
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(self._post(prompt))
+            task.add_done_callback(lambda done: self._forget(key, done))
+        # The shared task is shielded so one caller giving up doesn't cancel it for the others
+        raw_response = await asyncio.wait_for(asyncio.shield(task), self.deadline)
+        self._cache[key] = raw_response
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return raw_response
+
+    def _forget(self, key, task):
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # retrieved even when every caller gave up, so it isn't logged as lost
+
+    async def _check_each(self, method_texts):
+        names = list(method_texts)
+        outcomes = await asyncio.gather(
+            *(self._generate(method_texts[name], method_prompt(name, method_texts[name])) for name in names),
+            return_exceptions=True
+        )
+        errors, raw_responses = [], {}
+        for name, outcome in zip(names, outcomes):
+            if isinstance(outcome, Exception):
+                raw_responses[name] = self._describe_failure(outcome)
+            else:
+                raw_responses[name] = outcome
+                errors.extend(parse_errors(outcome, name))
+        return errors, raw_responses
+
+    async def _check_batch(self, method_texts):
+        ocr_text = '\n\n'.join(f"### {name}\n{text}" for name, text in method_texts.items())
+        try:
+            raw_response = await self._generate(ocr_text, batch_prompt(method_texts))
+        except Exception as e:
+            return [], {'batch': self._describe_failure(e)}
+        return parse_batch_errors(raw_response, set(method_texts)), {'batch': raw_response}
+
+    def check(self, method_results, batch=LLM_BATCH):
+        """
+        Spell-check the OCR results of several methods.
+
+        `method_results` maps a method name to its list of OCR items
+        ({'text', 'x', 'y', 'confidence'}); methods without results are
+        skipped. Returns (errors, raw_responses) where raw_responses maps
+        each method, or 'batch', to the model's reply or the failure reason.
+        """
+        method_texts = {name: format_ocr_lines(items) for name, items in method_results.items() if items}
+        if not method_texts:
+            return [], {}
+        loop = self._ensure_loop()
+        coroutine = self._check_batch(method_texts) if batch else self._check_each(method_texts)
+        future = asyncio.run_coroutine_threadsafe(coroutine, loop)
+        # Each call is bounded by the deadline already; the margin covers a busy loop thread
+        try:
+            return future.result(timeout=self.deadline + 5)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            llm_calls_total.inc(result="timeout")
+            reason = f"Ollama did not answer within {self.deadline:g}s"
+            return [], {'batch': reason} if batch else dict.fromkeys(method_texts, reason)
+
+    def _describe_failure(self, error):
+        if isinstance(error, CircuitOpen):
+            return str(error)
+        if isinstance(error, httpx.PoolTimeout):
+            return f"No free connection to Ollama within {self.pool_timeout:g}s"
+        if isinstance(error, httpx.TimeoutException):
+            return f"Ollama did not answer within {self.timeout:g}s"
+        if isinstance(error, asyncio.TimeoutError):
+            return f"Ollama did not answer within {self.deadline:g}s"
+        return f"Error connecting to Ollama: {str(error)}"
+
+    def stats(self):
+        return {
+            "url": self.url,
+            "model": self.model,
+            "breaker": self.breaker.state,
+            "cached_responses": len(self._cache),
+        }
+
@@ -1,23 +1,58 @@
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, UploadFile, File, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-import uuid
+from starlette.requests import ClientDisconnect
 import os
 from datetime import datetime
-import socket
-import pytesseract
-from PIL import Image
-import cv2
 import numpy as np
-import re
-from concurrent.futures import ThreadPoolExecutor
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future
 from gtts import gTTS
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse, JSONResponse, Response
 import threading
 import time
-import glob
+import io
+import asyncio
+import struct
+import json
+import subprocess
+import logging
+import contextvars
+from typing import List
+from collections import deque
+import uuid
+from urllib.parse import quote
+from text_align import split_sentences
+from ocr_pipeline import NO_TEXT_MESSAGE, decode_image, extract_text_with_info, extract_text_in_pool, init_ocr_worker
+from frame_cache import FrameCache, frame_signature
+from frame_quality import QUALITY_GATE, QUALITY_MESSAGES, assess_jpeg, select_sharpest
+from scene_detector import MJPEGSplitter, SceneDetector
+from reading_session import ReadingSessions, SESSION_MODES
+from audio_cache import AudioCache
+from job_scheduler import JobScheduler, QueueFull, new_job_id, JOB_WORKERS
+from result_events import ResultEvents, TERMINAL_STATES
+from audio_index import AudioIndex
+from result_store import create_result_store, decode_cursor
+from shared_state import create_shared_backend, EventRelay, SHARED_BACKEND, SHARED_STORAGE
+from metrics import (Collector, render as render_metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE, stage_seconds,
+                     ocr_pass_seconds, jobs_total, uploads_total, executor_busy)
+from structured_log import configure_logging, current_trace_id, TraceIDMiddleware
+
+if __name__ == "__main__":
+    # Started as a script: run the launcher in place of this module before
+    # any server state exists, so spawned OCR processes re-import serve.py
+    # instead of rebuilding the server in every child
+    import runpy
+    runpy.run_path(os.path.join(os.path.dirname(os.path.abspath(__file__)), "serve.py"), run_name="__main__")
+    raise SystemExit
+
+configure_logging()
+logger = logging.getLogger(__name__)
 
 app = FastAPI()
 
+# Bind a trace ID to every request; it follows the job onto worker threads
+app.add_middleware(TraceIDMiddleware)
+
 # Allow CORS for all origins
 app.add_middleware(
     CORSMiddleware,
@@ -26,228 +61,1064 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Folder to save uploaded images
-UPLOAD_FOLDER = "uploaded_images"
+# Folder to save uploaded images. With servers on several hosts, this and
+# AUDIO_FOLDER must be storage every host mounts (see shared_state).
+UPLOAD_FOLDER = os.environ.get("UPLOAD_FOLDER", "uploaded_images")
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# Keep a copy of every uploaded JPEG (written off the request path)
+SAVE_UPLOADS = os.environ.get("SAVE_UPLOADS", "1") == "1"
+
 # Folder to save TTS audio
-AUDIO_FOLDER = "output_audio"
+AUDIO_FOLDER = os.environ.get("AUDIO_FOLDER", "output_audio")
 os.makedirs(AUDIO_FOLDER, exist_ok=True)
 
-# Store OCR and TTS results
-processing_results = {}
-executor = ThreadPoolExecutor(max_workers=3)
+# Speech settings: TTS_BACKEND selects "gtts" (online, MP3) or "espeak"
+# (offline, 16 kHz mono WAV as played by the ESP32 I2S output). "stub"
+# produces silence of speech-like length for benchmarks and load tests.
+# The gTTS "voice" is the regional accent domain.
+TTS_BACKEND = os.environ.get("TTS_BACKEND", "gtts")
+TTS_LANG = "en"
+TTS_VOICE = os.environ.get("TTS_VOICE", "com")
+ESPEAK_COMMAND = os.environ.get("ESPEAK_COMMAND", "espeak-ng")
+ESPEAK_VOICE = os.environ.get("ESPEAK_VOICE", "en-us")
+TTS_SAMPLE_RATE = 16000
+TTS_STUB_LATENCY = float(os.environ.get("TTS_STUB_LATENCY", "0"))  # seconds per synthesis call
+
+# Sentence synthesis runs on its own pool so streaming clients get audio in
+# parallel with OCR work
+TTS_WORKERS = int(os.environ.get("TTS_WORKERS", "4"))
+tts_executor = ThreadPoolExecutor(max_workers=TTS_WORKERS)
+
+# Where OCR runs: "thread" runs it on the pipeline worker threads, "process"
+# hands frames to a pool of OCR processes through shared memory so that
+# Tesseract and OpenCV work is spread over every core
+OCR_EXECUTION = os.environ.get("OCR_EXECUTION", "thread")
+OCR_PROCESSES = int(os.environ.get("OCR_PROCESSES", str(os.cpu_count() or 1)))
+if OCR_EXECUTION == "process":
+    ocr_process_pool = ProcessPoolExecutor(
+        max_workers=OCR_PROCESSES,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_ocr_worker
+    )
+elif OCR_EXECUTION == "thread":
+    ocr_process_pool = None
+else:
+    raise ValueError(f"Unknown OCR_EXECUTION '{OCR_EXECUTION}', expected 'thread' or 'process'")
+
+# How long /audio-stream waits for OCR to finish before giving up (seconds)
+STREAM_TEXT_TIMEOUT = float(os.environ.get("STREAM_TEXT_TIMEOUT", "30"))
+
+# State shared with other server processes (None when running as one process)
+shared_backend = create_shared_backend()
+if SHARED_BACKEND == "redis" and not SHARED_STORAGE:
+    logger.warning("⚠ SHARED_BACKEND=redis shares job state only; audio and uploads stay on the host that made "
+                   "them. Across hosts, put AUDIO_FOLDER and UPLOAD_FOLDER on shared storage and set "
+                   "SHARED_STORAGE=1.")
+
+# Store OCR and TTS results (bounded in memory, optionally persisted to
+# SQLite, or in the shared backend when running several processes)
+processing_results = shared_backend.results if shared_backend else create_result_store()
+
+# File-existence checks reported with results are cached this long (seconds)
+EXISTS_CACHE_TTL = 30
+_exists_cache = {}
+
+# State transitions pushed to SSE / WebSocket / long-poll clients. With a
+# shared backend, events go through its log so subscribers on every process
+# see them; the relay delivers them locally.
+result_events = ResultEvents()
+if shared_backend:
+    EventRelay(shared_backend, result_events).start()
+
+# Upper bounds for clients waiting on a result (seconds)
+LONG_POLL_MAX_WAIT = float(os.environ.get("LONG_POLL_MAX_WAIT", "60"))
+EVENT_STREAM_TIMEOUT = float(os.environ.get("EVENT_STREAM_TIMEOUT", "300"))
+EVENT_KEEPALIVE_INTERVAL = 15
+
+# How long a one-shot /upload (?wait=true or ?respond=audio|multipart) holds
+# the request for the pipeline before answering with "processing" (seconds)
+UPLOAD_WAIT_TIMEOUT = float(os.environ.get("UPLOAD_WAIT_TIMEOUT", "30"))
+UPLOAD_RESPONSE_MODES = ("json", "audio", "multipart")
+
+def _event_state(result):
+    """Pipeline state reported to subscribers"""
+    if result.get("status") == "ocr_completed" and result.get("audio_status") == "generating":
+        return "generating"
+    return result.get("status")
+
+def _publish(filename, result):
+    if result.get("status") in TERMINAL_STATES:
+        jobs_total.inc(status=result["status"])
+    if shared_backend:
+        shared_backend.publish(filename, _event_state(result), result)
+    else:
+        result_events.publish(filename, _event_state(result), result)
+
+def set_result(filename, result):
+    """Replace a processing result and notify subscribers"""
+    result = processing_results.put(filename, result)
+    _publish(filename, result)
+
+def update_result(filename, fields):
+    """Update fields of a processing result and notify subscribers"""
+    result = processing_results.update(filename, fields)
+    _publish(filename, result)
+
+def cached_exists(path):
+    """os.path.exists with a short-lived cache, so result listings don't stat every file"""
+    now = time.time()
+    entry = _exists_cache.get(path)
+    if entry is None or now - entry[0] > EXISTS_CACHE_TTL:
+        if len(_exists_cache) > 10000:
+            _exists_cache.clear()
+        entry = (now, os.path.exists(path))
+        _exists_cache[path] = entry
+    return entry[1]
+
+def with_file_status(filename, result):
+    """Copy of a result with image/audio existence flags added"""
+    result = dict(result)
+    result["image_exists"] = cached_exists(os.path.join(UPLOAD_FOLDER, filename))
+    if result.get("audio_path"):
+        result["audio_exists"] = cached_exists(result["audio_path"])
+    return result
+
+# Header the glasses use to identify themselves for per-device fairness;
+# requests without it are grouped by client address
+DEVICE_HEADER = "X-Device-ID"
+
+def _mark_cancelled(job):
+    """Record a job that was cancelled or superseded before it finished"""
+    set_result(job.job_id, {
+        "status": "cancelled",
+        "filename": job.job_id,
+        "superseded_by": job.superseded_by,
+        "timestamp": datetime.now().isoformat()
+    })
+    logger.info("⏭ Cancelled %s%s", job.job_id,
+                f" (superseded by {job.superseded_by})" if job.superseded_by else "")
+
+# Bounded, per-device round-robin pipeline queue. With process OCR the
+# workers mostly wait on the pool, so run at least one per OCR process.
+scheduler = JobScheduler(
+    workers=max(JOB_WORKERS, OCR_PROCESSES) if ocr_process_pool else JOB_WORKERS,
+    on_cancel=_mark_cancelled
+)
+
+# Finished results of recent captures, keyed by perceptual hash of the frame
+frame_cache = FrameCache()
+
+# Newest audio overall and per device, built from one scan at startup
+audio_index = AudioIndex(AUDIO_FOLDER, shared=shared_backend)
+
+# Recent transcripts per device for "read only what's new" uploads
+reading_sessions = ReadingSessions(shared=shared_backend)
+
+def _latest_device_job(device_id):
+    """The newest accepted job of a device on any process, as (job, accepted_at), or None"""
+    if not shared_backend or device_id is None:
+        return None
+    marker = shared_backend.get_value(f"device_job:{device_id}")
+    if not marker:
+        return None
+    marker = json.loads(marker)
+    return marker["job"], marker["accepted_at"]
+
+def is_superseded(filename, device_id, accepted_at=None):
+    """Whether a job was cancelled, or a newer upload from its device was accepted on any process"""
+    if scheduler.is_cancelled(filename):
+        return True
+    latest = _latest_device_job(device_id)
+    # The marker is written after submit, so a job may briefly see its predecessor's
+    return latest is not None and latest[0] != filename and (accepted_at is None or latest[1] > accepted_at)
+
+def finish_superseded(filename, device_id):
+    """Give a job dropped by is_superseded its terminal state, unless on_cancel already did"""
+    if (processing_results.get(filename) or {}).get("status") == "cancelled":
+        return
+    latest = _latest_device_job(device_id)
+    set_result(filename, {
+        "status": "cancelled",
+        "filename": filename,
+        "superseded_by": latest[0] if latest and latest[0] != filename else None,
+        "timestamp": datetime.now().isoformat()
+    })
+    logger.info("⏭ Cancelled %s (superseded on another process)", filename)
+
+async def run_blocking(fn, *args):
+    """
+    Run a call that may block (SQLite store, shared backend, image work) off
+    the event loop, in a copy of the caller's context so the request's trace
+    ID reaches the call and any job it submits
+    """
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(None, context.run, fn, *args)
+
+def _record_ocr_timings(info):
+    """Move the stage timings reported by the OCR stage from its info into the metrics"""
+    timings = info.pop("ocr_timings", None)
+    if not timings:
+        return
+    for stage, seconds in timings["stages"].items():
+        stage_seconds.observe(seconds, stage=stage)
+    for psm, seconds in timings["passes"]:
+        ocr_pass_seconds.observe(seconds, psm=psm)
+
+def run_ocr(image):
+    """Run the OCR stage on a decoded frame, in the OCR process pool when configured"""
+    with stage_seconds.time(stage="ocr"):
+        if ocr_process_pool is not None:
+            with executor_busy.track_inprogress(executor="ocr_process"):
+                text, info = extract_text_in_pool(ocr_process_pool, image)
+        else:
+            text, info = extract_text_with_info(image)
+    _record_ocr_timings(info)
+    return text, info
 
 def extract_text_from_image(image_path):
     """Extract text from image using pytesseract with enhanced preprocessing and cropping"""
-    try:
-        image = cv2.imread(image_path)
-        if image is None:
-            return "Error: Could not read image"
-
-        # 🪄 Crop image to remove header, side UI noise
-        h, w, _ = image.shape
-        cropped = image[int(h*0.2):int(h*0.95), int(w*0.05):int(w*0.95)]
-
-        # Preprocess image
-        gray = cv2.cvtColor(cropped, cv2.COLOR_BGR2GRAY)
-        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-        binary = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                                       cv2.THRESH_BINARY, 11, 2)
-        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
-        cleaned = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel)
-        cleaned = cv2.morphologyEx(cleaned, cv2.MORPH_OPEN, kernel)
-
-        pil_image = Image.fromarray(cleaned)
-
-        # Multiple PSM configs for robust text extraction
-        configs = [
-            r'--oem 3 --psm 6',
-            r'--oem 3 --psm 8',
-            r'--oem 3 --psm 13'
-        ]
-
-        all_text = []
-        for config in configs:
-            try:
-                text = pytesseract.image_to_string(pil_image, config=config)
-                if text.strip():
-                    all_text.append(text.strip())
-            except:
-                continue
-
-        if all_text:
-            combined_text = ' '.join(all_text)
-            cleaned_text = ' '.join(combined_text.split())
-            cleaned_text = re.sub(r'[^\x00-\x7F]+', '', cleaned_text)  # remove non-ASCII
-            return cleaned_text
-        else:
-            return "No text detected in the image"
+    return extract_text_with_info(image_path)[0]
 
-    except Exception as e:
-        return f"OCR Error: {str(e)}"
+class TTSBackend:
+    """
+    Interface for speech synthesis backends.
+
+    synthesize() returns one self-contained chunk of audio for a piece of
+    text; chunks for consecutive sentences can be concatenated, and
+    file_header() supplies whatever container header has to precede them.
+    """
+    name = None
+    voice = None
+    extension = None        # extension of finished audio files
+    media_type = None       # content type served to clients
+    chunk_extension = None  # extension of cached chunks
+
+    def synthesize(self, text):
+        raise NotImplementedError
+
+    def file_header(self, data_length=None):
+        """Header for `data_length` bytes of chunks, or an open-ended stream when None"""
+        return b""
+
+class GTTSBackend(TTSBackend):
+    """Google Translate TTS; needs network access and produces MP3"""
+    name = "gtts"
+    extension = "mp3"
+    media_type = "audio/mpeg"
+    chunk_extension = "mp3"
+
+    def __init__(self, lang=TTS_LANG, voice=TTS_VOICE):
+        self.lang = lang
+        self.voice = voice
+
+    def synthesize(self, text):
+        # MP3 frames can be concatenated directly into one playable stream
+        buffer = io.BytesIO()
+        gTTS(text=text, lang=self.lang, tld=self.voice, slow=False).write_to_fp(buffer)
+        return buffer.getvalue()
+
+def wav_header(data_length=None, sample_rate=TTS_SAMPLE_RATE, channels=1, bits=16):
+    """44-byte PCM WAV header; an unknown length produces a maximal header for streaming"""
+    if data_length is None:
+        data_length = 0xFFFFFFFF - 36
+    byte_rate = sample_rate * channels * bits // 8
+    return struct.pack("<4sI4s4sIHHIIHH4sI", b"RIFF", 36 + data_length, b"WAVE", b"fmt ", 16, 1,
+                       channels, sample_rate, byte_rate, channels * bits // 8, bits, b"data", data_length)
+
+def _read_wav(data):
+    """Return (sample_rate, channels, pcm_bytes) from 16-bit PCM WAV bytes, tolerating streamed headers"""
+    position = 12
+    sample_rate, channels = TTS_SAMPLE_RATE, 1
+    while position + 8 <= len(data):
+        chunk_id, chunk_size = struct.unpack("<4sI", data[position:position + 8])
+        body = position + 8
+        if chunk_id == b"fmt ":
+            channels, sample_rate = struct.unpack("<HI", data[body + 2:body + 8])
+        elif chunk_id == b"data":
+            # Streamed output has a placeholder size, so take everything left
+            return sample_rate, channels, data[body:]
+        position = body + chunk_size + (chunk_size & 1)
+    raise ValueError("No PCM data in WAV output")
+
+class EspeakBackend(TTSBackend):
+    """Offline eSpeak NG synthesis rendered to 16 kHz / 16-bit mono PCM"""
+    name = "espeak"
+    extension = "wav"
+    media_type = "audio/wav"
+    chunk_extension = "pcm"
+
+    def __init__(self, voice=ESPEAK_VOICE, command=ESPEAK_COMMAND, sample_rate=TTS_SAMPLE_RATE):
+        self.voice = voice
+        self.command = command
+        self.sample_rate = sample_rate
+
+    def synthesize(self, text):
+        completed = subprocess.run([self.command, "--stdout", "--stdin", "-v", self.voice],
+                                   input=text.encode("utf-8"), capture_output=True, check=True)
+        source_rate, channels, pcm = _read_wav(completed.stdout)
+        samples = np.frombuffer(pcm[:len(pcm) - len(pcm) % (2 * channels)], dtype="<i2")
+        if channels > 1:
+            samples = samples.reshape(-1, channels).mean(axis=1)
+        if source_rate != self.sample_rate and len(samples):
+            duration = len(samples) / source_rate
+            target_times = np.arange(int(duration * self.sample_rate)) / self.sample_rate
+            samples = np.interp(target_times, np.arange(len(samples)) / source_rate, samples)
+        return np.clip(np.round(samples), -32768, 32767).astype("<i2").tobytes()
+
+    def file_header(self, data_length=None):
+        return wav_header(data_length, self.sample_rate)
+
+class StubBackend(TTSBackend):
+    """Offline stand-in that returns silence as long as the text would take to speak"""
+    name = "stub"
+    voice = "silence"
+    extension = "wav"
+    media_type = "audio/wav"
+    chunk_extension = "pcm"
+
+    # Typical speaking rate
+    CHARACTERS_PER_SECOND = 15
+
+    def __init__(self, sample_rate=TTS_SAMPLE_RATE, latency=TTS_STUB_LATENCY):
+        self.sample_rate = sample_rate
+        self.latency = latency
+
+    def synthesize(self, text):
+        if self.latency:
+            time.sleep(self.latency)
+        return bytes(2 * int(self.sample_rate * len(text) / self.CHARACTERS_PER_SECOND))
+
+    def file_header(self, data_length=None):
+        return wav_header(data_length, self.sample_rate)
+
+TTS_BACKENDS = {
+    "gtts": GTTSBackend,
+    "espeak": EspeakBackend,
+    "stub": StubBackend,
+}
+
+def create_tts_backend(name):
+    """Instantiate the configured TTS backend"""
+    if name not in TTS_BACKENDS:
+        raise ValueError(f"Unknown TTS backend '{name}', expected one of {sorted(TTS_BACKENDS)}")
+    return TTS_BACKENDS[name]()
+
+tts_backend = create_tts_backend(TTS_BACKEND)
+
+def audio_media_type(filename):
+    """Content type for a generated audio file"""
+    return "audio/wav" if filename.endswith(".wav") else "audio/mpeg"
+
+# Synthesized speech chunks reused across transcripts and sentences
+audio_cache = AudioCache(os.path.join(AUDIO_FOLDER, "tts_cache", tts_backend.name),
+                         extension=tts_backend.chunk_extension)
+
+# Scrape-time views of state the scheduler, executors and caches already keep
+Collector("smartglass_queue_depth", "Jobs waiting in the scheduler", lambda: scheduler.stats()["queue_depth"])
+Collector("smartglass_jobs_running", "Jobs currently running on scheduler workers",
+          lambda: scheduler.stats()["running"])
+Collector("smartglass_executor_workers", "Configured workers per executor",
+          lambda: {("pipeline",): scheduler.workers, ("tts",): TTS_WORKERS,
+                   ("ocr_process",): OCR_PROCESSES if ocr_process_pool else 0}, ("executor",))
+Collector("smartglass_cache_requests_total", "Cache lookups by cache and result",
+          lambda: {("frame", "hit"): frame_cache.hits, ("frame", "miss"): frame_cache.misses,
+                   ("audio", "hit"): audio_cache.hits, ("audio", "miss"): audio_cache.misses},
+          ("cache", "result"), kind="counter")
+
+# Sentences currently being synthesized, so the pipeline and streaming
+# clients share one synthesis call per sentence
+_pending_sentences = {}
+_pending_lock = threading.RLock()
+
+def _synthesize_sentence(sentence):
+    with executor_busy.track_inprogress(executor="tts"), stage_seconds.time(stage="tts_synthesis"):
+        data = tts_backend.synthesize(sentence)
+    audio_cache.put_bytes(sentence, TTS_LANG, tts_backend.voice, data)
+    return data
+
+def submit_sentence(sentence):
+    """
+    Return a Future resolving to the audio bytes of one sentence.
+
+    Cached sentences resolve immediately; otherwise synthesis is queued on
+    the TTS pool, and concurrent requests for the same sentence share it.
+    """
+    data = audio_cache.get_bytes(sentence, TTS_LANG, tts_backend.voice)
+    if data is not None:
+        future = Future()
+        future.set_result(data)
+        return future
+
+    key = audio_cache.key(sentence, TTS_LANG, tts_backend.voice)
+    with _pending_lock:
+        future = _pending_sentences.get(key)
+        if future is None:
+            future = tts_executor.submit(contextvars.copy_context().run, _synthesize_sentence, sentence)
+            _pending_sentences[key] = future
+            future.add_done_callback(lambda _, key=key: _discard_pending(key))
+    return future
+
+def _discard_pending(key):
+    with _pending_lock:
+        _pending_sentences.pop(key, None)
+
+def is_speakable(text):
+    """Whether OCR output is real text worth synthesizing"""
+    return bool(text) and not text.strip().lower().startswith("error") and text != NO_TEXT_MESSAGE
 
 def generate_audio_from_text(text, base_filename):
-    """Generate audio file from text using gTTS"""
+    """Generate audio file from text with the configured TTS backend, reusing cached speech where possible"""
     try:
-        print(f"🎵 Generating audio for: {base_filename}.mp3")
-        print(f"📝 Text: {text[:100]}...")  # Show first 100 chars
-        
-        # Create gTTS object with English language
-        tts = gTTS(text=text, lang='en', slow=False)
+        audio_filename = f"{base_filename}.{tts_backend.extension}"
+        logger.info("🎵 Generating audio for: %s (%s)", audio_filename, tts_backend.name)
+        logger.debug("📝 Text: %s...", text[:100])  # Show first 100 chars
         
-        # Save audio file
-        audio_path = os.path.join(AUDIO_FOLDER, f"{base_filename}.mp3")
-        tts.save(audio_path)
+        audio_path = os.path.join(AUDIO_FOLDER, audio_filename)
+
+        data = audio_cache.get_bytes(text, TTS_LANG, tts_backend.voice)
+        if data is not None:
+            # Whole transcript already synthesized
+            logger.info("♻ Reusing cached audio for identical text")
+        else:
+            # Synthesize only the sentences we have not heard before, in
+            # parallel, then join the chunks
+            sentences = split_sentences(text)
+            futures = [submit_sentence(sentence) for sentence in sentences]
+            data = b"".join(future.result() for future in futures)
+            logger.info("🧩 Assembled audio from %d sentences", len(sentences))
+            if len(sentences) > 1:
+                audio_cache.put_bytes(text, TTS_LANG, tts_backend.voice, data)
+
+        with stage_seconds.time(stage="audio_write"), open(audio_path, "wb") as f:
+            f.write(tts_backend.file_header(len(data)))
+            f.write(data)
         
         # Verify file was created
         if os.path.exists(audio_path):
             file_size = os.path.getsize(audio_path)
-            print(f"✅ Audio generated successfully: {audio_path} ({file_size} bytes)")
+            logger.info("✅ Audio generated successfully: %s (%d bytes)", audio_path, file_size)
             return audio_path
         else:
-            print(f"❌ Audio file not created: {audio_path}")
+            logger.error("❌ Audio file not created: %s", audio_path)
             return None
             
     except Exception as e:
-        print(f"❌ Audio generation error: {str(e)}")
+        logger.error("❌ Audio generation error: %s", e)
         return None
 
-def process_image_complete(base_filename, file_path):
-    """Complete processing pipeline: OCR + TTS in single function"""
+def process_image_complete(base_filename, image_data, signature=None, device_id=None, session=None,
+                           accepted_at=None):
+    """
+    Complete processing pipeline: OCR + TTS in single function.
+
+    `image_data` is the uploaded JPEG bytes, decoded here in the worker so
+    the frame never has to round-trip through disk; a file path is also
+    accepted. With `session` set to "incremental" only the words the
+    device's reading session has not seen yet are spoken; "repeat" speaks
+    everything and still records it in the session. `signature` is the
+    frame-cache key the result is stored under. `accepted_at` is when
+    the upload was accepted, used to tell newer captures of the device on
+    other processes from older ones.
+    """
+    with executor_busy.track_inprogress(executor="pipeline"), stage_seconds.time(stage="pipeline"):
+        _process_image(base_filename, image_data, signature, device_id, session, accepted_at)
+
+def _process_image(base_filename, image_data, signature, device_id, session, accepted_at):
     try:
-        print(f"\n🔄 Starting complete processing for: {base_filename}")
+        logger.info("🔄 Starting complete processing for: %s", base_filename)
         
         # Step 1: OCR Processing
-        print("📝 Step 1: Extracting text from image...")
-        extracted_text = extract_text_from_image(file_path)
+        if isinstance(image_data, bytes):
+            with stage_seconds.time(stage="decode"):
+                image = decode_image(image_data)
+        else:
+            image = image_data
+        extracted_text, ocr_info = run_ocr(image)
+
+        # A newer capture from the same device makes this one obsolete
+        if is_superseded(base_filename + ".jpg", device_id, accepted_at):
+            logger.info("⏭ Skipping TTS for superseded job: %s", base_filename)
+            finish_superseded(base_filename + ".jpg", device_id)
+            return
         
+        # Reading session: speak only what the device has not heard yet. The
+        # words are recorded as heard only once their audio exists.
+        spoken_text = extracted_text
+        in_session = bool(session and is_speakable(extracted_text))
+        if in_session:
+            spoken_text = reading_sessions.unread(device_id, extracted_text, repeat=session == "repeat")
+
         # Update status
-        processing_results[base_filename + ".jpg"] = {
+        set_result(base_filename + ".jpg", {
             "status": "ocr_completed",
+            "filename": base_filename + ".jpg",
+            "device_id": device_id,
             "text": extracted_text,
             "ocr_timestamp": datetime.now().isoformat(),
-            "audio_status": "pending"
-        }
+            "audio_status": "pending",
+            **({"session": session, "spoken_text": spoken_text} if in_session else {}),
+            **ocr_info
+        })
         
-        print("📝 Extracted Text:")
-        print("=" * 50)
-        print(extracted_text)
-        print("=" * 50)
+        logger.info("📝 Extracted text for %s: %s", base_filename, extracted_text,
+                    extra={"job": base_filename, "ocr_passes": ocr_info.get("ocr_passes")})
+
+        if in_session:
+            if not spoken_text:
+                reading_sessions.advance(device_id, extracted_text)
+                update_result(base_filename + ".jpg", {
+                    "status": "ocr_only",
+                    "audio_status": "skipped",
+                    "audio_error": "No new text since the previous capture"
+                })
+                logger.info("⏭ Nothing new to read for %s: %s", device_id, base_filename)
+                return
+            if spoken_text != extracted_text:
+                logger.info("🆕 New text only: %s", spoken_text)
         
         # Step 2: Audio Generation (if text is valid)
-        if extracted_text and not extracted_text.strip().lower().startswith("error") and extracted_text != "No text detected in the image":
-            print("🎵 Step 2: Generating audio from text...")
+        if is_speakable(spoken_text):
             
             # Update status
-            processing_results[base_filename + ".jpg"]["audio_status"] = "generating"
+            update_result(base_filename + ".jpg", {"audio_status": "generating"})
             
             # Generate audio
-            audio_path = generate_audio_from_text(extracted_text, base_filename)
+            audio_path = generate_audio_from_text(spoken_text, base_filename)
             
-            if audio_path:
+            if is_superseded(base_filename + ".jpg", device_id, accepted_at):
+                logger.info("⏭ Discarding result of superseded job: %s", base_filename)
+                finish_superseded(base_filename + ".jpg", device_id)
+            elif audio_path:
                 # Update final status
-                processing_results[base_filename + ".jpg"].update({
+                update_result(base_filename + ".jpg", {
                     "status": "completed",
                     "audio_status": "completed",
                     "audio_path": audio_path,
                     "audio_timestamp": datetime.now().isoformat()
                 })
-                print(f"✅ Complete processing finished for: {base_filename}")
+                audio_index.add(audio_path, device_id)
+                if in_session:
+                    reading_sessions.advance(device_id, extracted_text)
+                if spoken_text == extracted_text:
+                    # Partial audio must never be replayed for the whole frame
+                    frame_cache.put(signature, {
+                        "text": extracted_text,
+                        "audio_path": audio_path,
+                        "source_filename": base_filename + ".jpg"
+                    })
+                logger.info("✅ Complete processing finished for: %s", base_filename)
             else:
                 # Audio generation failed
-                processing_results[base_filename + ".jpg"].update({
+                update_result(base_filename + ".jpg", {
                     "status": "ocr_only",
                     "audio_status": "failed",
                     "audio_error": "Audio generation failed"
                 })
-                print(f"⚠ OCR completed but audio generation failed for: {base_filename}")
+                logger.warning("⚠ OCR completed but audio generation failed for: %s", base_filename)
         else:
             # No valid text for audio generation
-            processing_results[base_filename + ".jpg"].update({
+            update_result(base_filename + ".jpg", {
                 "status": "ocr_only",
                 "audio_status": "skipped",
                 "audio_error": "No valid text for audio generation"
             })
-            print(f"⚠ OCR completed but no valid text for audio generation: {base_filename}")
+            logger.warning("⚠ OCR completed but no valid text for audio generation: %s", base_filename)
             
     except Exception as e:
-        processing_results[base_filename + ".jpg"] = {
+        set_result(base_filename + ".jpg", {
             "status": "error",
             "error": str(e),
             "timestamp": datetime.now().isoformat()
-        }
-        print(f"❌ Processing error for {base_filename}: {str(e)}")
+        })
+        logger.exception("❌ Processing error for %s: %s", base_filename, e)
 
-@app.post("/upload")
-async def upload_image(file: UploadFile = File(...)):
-    """Upload image and start complete processing pipeline"""
+def save_upload(file_path, contents):
+    """Persist an uploaded image; runs on a worker thread, never on the event loop"""
     try:
-        now = datetime.now()
-        # Generate a base filename without extension
-        base_filename = f"ESP32_{now.year}{now.month:02}{now.day:02}{now.hour:02}{now.minute:02}_{now.second:02}"
-        file_path = os.path.join(UPLOAD_FOLDER, base_filename + ".jpg")
-
-        # Save uploaded file
         with open(file_path, "wb") as f:
-            f.write(await file.read())
+            f.write(contents)
+        logger.debug("✅ Image saved: %s", file_path)
+    except Exception as e:
+        logger.error("❌ Could not save %s: %s", file_path, e)
+
+def device_id_for(request):
+    """Identify the glasses behind a request for per-device scheduling"""
+    device_id = request.headers.get(DEVICE_HEADER)
+    if device_id:
+        return device_id
+    return request.client.host if request.client else "unknown"
+
+def _read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+def _multipart_result(result, audio_data, audio_filename):
+    """multipart/mixed body with the JSON result first and the audio (if any) second"""
+    boundary = uuid.uuid4().hex
+    parts = [
+        f"--{boundary}\r\nContent-Type: application/json\r\n\r\n".encode()
+        + json.dumps(result).encode() + b"\r\n"
+    ]
+    if audio_data is not None:
+        parts.append(
+            f"--{boundary}\r\nContent-Type: {audio_media_type(audio_filename)}\r\n"
+            f"Content-Disposition: attachment; filename=\"{audio_filename}\"\r\n\r\n".encode()
+            + audio_data + b"\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return Response(content=b"".join(parts), media_type=f"multipart/mixed; boundary={boundary}")
+
+async def one_shot_response(filename, respond):
+    """
+    Hold an upload until its pipeline finishes and answer with the outcome:
+    the final result as JSON, the audio body with the transcript in headers,
+    or a multipart response carrying both.
+    """
+    result = await wait_for_result(filename, lambda result: result.get("status") in TERMINAL_STATES,
+                                   UPLOAD_WAIT_TIMEOUT)
+    if result is None or result.get("status") not in TERMINAL_STATES:
+        # Still running: the device can fall back to polling or /events
+        return JSONResponse(status_code=202, content={
+            "status": "success",
+            "filename": filename,
+            "message": "Processing did not finish in time; poll /processing-result for the outcome.",
+            "processing_status": "processing"
+        })
+
+    audio_path = result.get("audio_path") if result.get("status") == "completed" else None
+    audio_filename = os.path.basename(audio_path) if audio_path else None
+    payload = {
+        "status": "success" if result.get("status") != "error" else "error",
+        "filename": filename,
+        "processing_status": result.get("status"),
+        "text": result.get("text", ""),
+        "spoken_text": result.get("spoken_text", result.get("text", "")),
+        "audio_filename": audio_filename,
+        "cache_hit": result.get("cache_hit", False)
+    }
+    if result.get("status") == "error":
+        payload["error"] = result.get("error")
+
+    if respond == "json":
+        return payload
+    audio_data = None
+    if audio_path:
+        try:
+            audio_data = await asyncio.get_running_loop().run_in_executor(None, _read_file, audio_path)
+        except OSError:
+            audio_filename = payload["audio_filename"] = None
+    if respond == "multipart":
+        return _multipart_result(payload, audio_data, audio_filename)
+    if audio_data is None:
+        # Nothing to play; the JSON says why
+        return payload
+    # Headers are latin-1 only, so the transcript is percent-encoded UTF-8
+    return Response(content=audio_data, media_type=audio_media_type(audio_filename), headers={
+        "X-Filename": filename,
+        "X-Audio-Filename": audio_filename,
+        "X-Processing-Status": result.get("status"),
+        "X-Transcript": quote(payload["text"])
+    })
+
+def _check_upload_modes(respond, session=None):
+    if respond not in UPLOAD_RESPONSE_MODES:
+        return JSONResponse(status_code=400, content={
+            "status": "error",
+            "message": f"Unknown respond mode '{respond}', expected one of {', '.join(UPLOAD_RESPONSE_MODES)}"
+        })
+    if session is not None and session not in SESSION_MODES:
+        return JSONResponse(status_code=400, content={
+            "status": "error",
+            "message": f"Unknown session mode '{session}', expected one of {', '.join(SESSION_MODES)}"
+        })
+    return None
+
+def reject_frame(base_filename, device_id, quality):
+    """Record and answer a frame turned away by the quality gate"""
+    reason = quality["reason"]
+    set_result(base_filename + ".jpg", {
+        "status": "rejected",
+        "timestamp": datetime.now().isoformat(),
+        "filename": base_filename + ".jpg",
+        "device_id": device_id,
+        "reason": reason,
+        "quality": quality
+    })
+    logger.info("🙈 Rejected frame %s from %s: %s", base_filename, device_id, reason)
+    uploads_total.inc(outcome="rejected")
+    return JSONResponse(status_code=422, content={
+        "status": "rejected",
+        "filename": base_filename + ".jpg",
+        "reason": reason,
+        "message": QUALITY_MESSAGES[reason],
+        "quality": quality
+    })
+
+def record_cache_hit(base_filename, device_id, cached, session):
+    """Record an upload answered from the frame cache as completed"""
+    set_result(base_filename + ".jpg", {
+        "status": "completed",
+        "timestamp": datetime.now().isoformat(),
+        "filename": base_filename + ".jpg",
+        "device_id": device_id,
+        "text": cached["text"],
+        "audio_status": "completed",
+        "audio_path": cached["audio_path"],
+        "cache_hit": True,
+        "cached_from": cached["source_filename"]
+    })
+    audio_index.add(cached["audio_path"], device_id)
+    if session:
+        reading_sessions.advance(device_id, cached["text"], repeat=True)
 
-        print(f"✅ Image saved: {file_path}")
+async def accept_frame(device_id, contents, wait, respond, quality=None, details=None, session=None):
+    """
+    Run one uploaded frame through the frame cache, the quality gate and the
+    scheduler, and build the upload response. `details` are extra fields
+    for the immediate JSON response; `session` is the reading-session mode.
+    """
+    # Collision-free job name; the image, result and audio all use it
+    base_filename = new_job_id()
+    file_path = os.path.join(UPLOAD_FOLDER, base_filename + ".jpg")
+
+    # Repeated capture of the same scene: answer from the frame cache. In an
+    # incremental session the pipeline decides what is new instead.
+    signature = await run_blocking(frame_signature, contents)
+    cached = await run_blocking(frame_cache.get, signature) if session != "incremental" else None
+    if cached and not os.path.exists(cached["audio_path"]):
+        await run_blocking(frame_cache.discard, signature)
+        cached = None
+    if cached:
+        logger.info("♻ Frame matches %s (distance %d, similarity %.2f), reusing result", cached["source_filename"],
+                    cached["cache_distance"], cached["cache_similarity"])
+        uploads_total.inc(outcome="cache_hit")
+        await run_blocking(record_cache_hit, base_filename, device_id, cached, session)
+        response = {
+            "status": "success",
+            "filename": base_filename + ".jpg",
+            "message": "Image matches a recent capture. Cached text and audio returned.",
+            "processing_status": "completed",
+            "cache_hit": True,
+            "text": cached["text"],
+            "audio_filename": os.path.basename(cached["audio_path"])
+        }
+    else:
+        # Frames that could never produce usable text stop here
+        if QUALITY_GATE:
+            quality = quality or await run_blocking(assess_jpeg, contents)
+            if not quality["ok"]:
+                return await run_blocking(reject_frame, base_filename, device_id, quality)
 
         # Initialize processing status
-        processing_results[base_filename + ".jpg"] = {
+        await run_blocking(set_result, base_filename + ".jpg", {
             "status": "processing", 
             "timestamp": datetime.now().isoformat(),
-            "filename": base_filename + ".jpg"
-        }
+            "filename": base_filename + ".jpg",
+            "device_id": device_id,
+            "trace_id": current_trace_id()
+        })
         
-        # Start complete processing pipeline in background
-        executor.submit(process_image_complete, base_filename, file_path)
+        # Queue the complete processing pipeline for this device; once it is
+        # accepted, the shared marker lets other processes drop this
+        # device's older jobs
+        accepted_at = time.time()
+        try:
+            await run_blocking(scheduler.submit, device_id, base_filename + ".jpg", process_image_complete,
+                               base_filename, contents, signature, device_id, session, accepted_at)
+        except QueueFull as e:
+            await run_blocking(processing_results.delete, base_filename + ".jpg")
+            logger.warning("🚦 Queue full, rejecting upload from %s", device_id)
+            uploads_total.inc(outcome="busy")
+            return JSONResponse(
+                status_code=429,
+                headers={"Retry-After": str(e.retry_after)},
+                content={"status": "busy", "message": str(e), "retry_after": e.retry_after}
+            )
 
-        return {
+        if shared_backend:
+            await run_blocking(shared_backend.set_value, f"device_job:{device_id}",
+                               json.dumps({"job": base_filename + ".jpg", "accepted_at": accepted_at}))
+        uploads_total.inc(outcome="queued")
+        response = {
             "status": "success",
             "filename": base_filename + ".jpg",
             "message": "Image uploaded successfully. OCR and TTS processing started automatically.",
             "processing_status": "started"
         }
+
+    # Keep the original JPEG as a side task; OCR works from memory
+    if SAVE_UPLOADS:
+        asyncio.get_running_loop().run_in_executor(None, save_upload, file_path, contents)
+
+    if wait:
+        return await one_shot_response(base_filename + ".jpg", respond)
+    if details:
+        response.update(details)
+    return response
+
+@app.post("/upload")
+async def upload_image(request: Request, file: UploadFile = File(...), wait: bool = False,
+                       respond: str = "json", session: str = None):
+    """
+    Upload image and start complete processing pipeline.
+
+    By default the response is sent as soon as the job is queued. With
+    ?wait=true the request is held until the pipeline finishes and the final
+    result is returned; ?respond=audio returns the audio body directly with
+    the transcript in the X-Transcript header, and ?respond=multipart returns
+    the JSON result and the audio together. Both imply waiting.
+
+    Blurry, badly exposed or text-free frames are rejected with 422 and a
+    reason code before any OCR runs.
+
+    ?session=incremental speaks only the text this device has not heard in
+    its current reading session; ?session=repeat reads everything again.
+    """
+    invalid = _check_upload_modes(respond, session)
+    if invalid:
+        return invalid
+    try:
+        with stage_seconds.time(stage="upload_read"):
+            contents = await file.read()
+        return await accept_frame(device_id_for(request), contents, wait or respond != "json", respond,
+                                  session=session)
+    except Exception as e:
+        logger.exception("❌ Upload error: %s", e)
+        return {"error": str(e)}
+
+@app.post("/upload-burst")
+async def upload_burst(request: Request, files: List[UploadFile] = File(...), wait: bool = False,
+                       respond: str = "json", session: str = None):
+    """
+    Upload several frames of one capture and process only the sharpest.
+
+    Every frame goes through the quality gate; the sharpest frame that
+    passes is run through the pipeline exactly like a single /upload, and
+    the others are dropped. Accepts the same ?wait, ?respond and ?session
+    options.
+    """
+    invalid = _check_upload_modes(respond, session)
+    if invalid:
+        return invalid
+    try:
+        with stage_seconds.time(stage="upload_read"):
+            frames = [await file.read() for file in files]
+        loop = asyncio.get_running_loop()
+        assessments = await loop.run_in_executor(None, lambda: [assess_jpeg(frame) for frame in frames])
+        selected = select_sharpest(assessments)
+        if selected is None:
+            return JSONResponse(status_code=400, content={"status": "error", "message": "No frames uploaded"})
+        logger.info("📸 Burst of %d frames, selected #%d (sharpness %s)", len(frames), selected,
+                    assessments[selected]["sharpness"])
+        details = {"burst": {
+            "frames": len(frames),
+            "selected": selected,
+            "sharpness": [quality["sharpness"] for quality in assessments]
+        }}
+        return await accept_frame(device_id_for(request), frames[selected], wait or respond != "json", respond,
+                                  quality=assessments[selected], details=details, session=session)
     except Exception as e:
-        print(f"❌ Upload error: {str(e)}")
+        logger.exception("❌ Burst upload error: %s", e)
         return {"error": str(e)}
 
+# Triggered jobs remembered per stream for its closing summary
+STREAM_SUMMARY_JOBS = 50
+
+@app.post("/stream")
+async def ingest_stream(request: Request, session: str = None):
+    """
+    Hands-free reading: accept a continuous MJPEG (multipart/x-mixed-replace)
+    frame stream in the request body and run the OCR + TTS pipeline only on
+    frames where the scene has changed and then held still.
+
+    Triggered frames go through the same path as /upload (frame cache,
+    quality gate, per-device scheduling); the audio is picked up with
+    /latest-audio?device_id=. ?session=incremental pairs well with
+    continuous reading. A summary is returned when the stream ends.
+    """
+    invalid = _check_upload_modes("json", session)
+    if invalid:
+        return invalid
+    device_id = device_id_for(request)
+    splitter = MJPEGSplitter()
+    detector = SceneDetector()
+    loop = asyncio.get_running_loop()
+    jobs = deque(maxlen=STREAM_SUMMARY_JOBS)
+    logger.info("🎥 Stream started from %s", device_id)
+    try:
+        async for chunk in request.stream():
+            for frame in splitter.feed(chunk):
+                stable = await loop.run_in_executor(None, detector.feed, frame)
+                if stable is None:
+                    continue
+                response = await accept_frame(device_id, stable, False, "json", session=session)
+                if isinstance(response, JSONResponse):
+                    response = json.loads(response.body)
+                logger.info("🎯 Scene settled on stream from %s: %s (%s)", device_id, response.get("filename"),
+                            response.get("processing_status", response.get("status")))
+                jobs.append({
+                    "filename": response.get("filename"),
+                    "status": response.get("processing_status", response.get("status")),
+                    "reason": response.get("reason")
+                })
+    except ClientDisconnect:
+        pass
+    logger.info("🎥 Stream from %s ended after %d frames, %d triggers", device_id, detector.frames, detector.triggers)
+    return {
+        "status": "success",
+        "device_id": device_id,
+        **detector.stats(),
+        "dropped": splitter.dropped,
+        "jobs": list(jobs)
+    }
+
+@app.delete("/session/{device_id}")
+async def reset_reading_session(device_id: str):
+    """Forget a device's reading session so its next capture is read in full"""
+    await run_blocking(reading_sessions.reset, device_id)
+    return {"status": "success", "device_id": device_id, "message": "Reading session reset"}
+
+@app.get("/queue-stats")
+async def get_queue_stats():
+    """Queue depth, wait-time and throughput statistics of the pipeline scheduler"""
+    return scheduler.stats()
+
+async def wait_for_result(filename, predicate, timeout):
+    """
+    Wait until a file's processing result satisfies `predicate` or the
+    timeout expires, woken by pipeline events rather than polling.
+    Returns the latest result, or None if the file is unknown.
+    """
+    queue = result_events.subscribe(filename)
+    try:
+        result = await run_blocking(processing_results.get, filename)
+        if result is None or predicate(result):
+            return result
+        deadline = time.time() + timeout
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return await run_blocking(processing_results.get, filename)
+            try:
+                event = await asyncio.wait_for(queue.get(), remaining)
+            except asyncio.TimeoutError:
+                return await run_blocking(processing_results.get, filename)
+            if predicate(event["result"]):
+                return event["result"]
+    finally:
+        result_events.unsubscribe(filename, queue)
+
+async def result_event_stream(filename, timeout=EVENT_STREAM_TIMEOUT):
+    """
+    Yield the current state of a job and then every state transition until
+    it reaches a terminal state. Yields None after each keep-alive interval
+    without events.
+    """
+    queue = result_events.subscribe(filename)
+    try:
+        result = await run_blocking(processing_results.get, filename)
+        if result is None:
+            yield {"filename": filename, "state": "not_found", "result": None}
+            return
+        event = {"filename": filename, "state": _event_state(result), "result": result.copy()}
+        deadline = time.time() + timeout
+        while True:
+            yield event
+            if event["state"] in TERMINAL_STATES:
+                return
+            event = None
+            while event is None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return
+                try:
+                    event = await asyncio.wait_for(queue.get(), min(remaining, EVENT_KEEPALIVE_INTERVAL))
+                except asyncio.TimeoutError:
+                    yield None
+    finally:
+        result_events.unsubscribe(filename, queue)
+
+def _public_event(event):
+    """Event payload for clients, with server-side paths reduced to filenames"""
+    result = dict(event["result"] or {})
+    if result.get("audio_path"):
+        result["audio_filename"] = os.path.basename(result.pop("audio_path"))
+    return {"filename": event["filename"], "state": event["state"], "result": result}
+
+@app.get("/events/{filename}")
+async def stream_result_events(filename: str):
+    """Server-sent events stream of a job's state transitions"""
+    async def sse():
+        async for event in result_event_stream(filename):
+            if event is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"event: {event['state']}\ndata: {json.dumps(_public_event(event))}\n\n"
+
+    return StreamingResponse(sse(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.websocket("/ws/{filename}")
+async def result_events_websocket(websocket: WebSocket, filename: str):
+    """WebSocket stream of a job's state transitions; closes once the job is finished"""
+    await websocket.accept()
+    try:
+        async for event in result_event_stream(filename):
+            if event is not None:
+                await websocket.send_json(_public_event(event))
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
 @app.get("/processing-result/{filename}")
-async def get_processing_result(filename: str):
-    """Get complete processing result (OCR + TTS) for a specific file"""
-    if filename in processing_results:
-        result = processing_results[filename].copy()
-        
-        # Add file existence checks
-        image_path = os.path.join(UPLOAD_FOLDER, filename)
-        result["image_exists"] = os.path.exists(image_path)
-        
-        if result.get("audio_path"):
-            result["audio_exists"] = os.path.exists(result["audio_path"])
-        
-        return result
+async def get_processing_result(filename: str, wait: float = 0):
+    """
+    Get complete processing result (OCR + TTS) for a specific file.
+
+    With ?wait=N the request is held for up to N seconds until the job
+    reaches a final state (long-poll).
+    """
+    if wait > 0:
+        await wait_for_result(filename, lambda result: result.get("status") in TERMINAL_STATES,
+                              min(wait, LONG_POLL_MAX_WAIT))
+    result = await run_blocking(processing_results.get, filename)
+    if result is not None:
+        return with_file_status(filename, result)
     else:
         return {"status": "not_found", "message": "Processing result not found for this filename"}
 
 @app.get("/processing-results")
-async def get_all_processing_results():
-    """Get all processing results with file existence checks"""
-    results = {}
-    for filename, result in processing_results.items():
-        result_copy = result.copy()
-        
-        # Add file existence checks
-        image_path = os.path.join(UPLOAD_FOLDER, filename)
-        result_copy["image_exists"] = os.path.exists(image_path)
-        
-        if result.get("audio_path"):
-            result_copy["audio_exists"] = os.path.exists(result["audio_path"])
-        
-        results[filename] = result_copy
-    
-    return results
+async def get_all_processing_results(status: str = None, device_id: str = None, cursor: str = None,
+                                     limit: int = 50):
+    """
+    List processing results newest first with file existence checks.
+
+    Filter with ?status= and ?device_id=; pass the returned next_cursor as
+    ?cursor= to fetch the following page.
+    """
+    try:
+        decode_cursor(cursor)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"status": "error", "message": str(e)})
+    limit = max(1, min(limit, 500))
+    page, next_cursor = await run_blocking(
+        lambda: processing_results.list(status=status, device_id=device_id, cursor=cursor, limit=limit))
+    return {
+        "results": {filename: with_file_status(filename, result) for filename, result in page},
+        "count": len(page),
+        "next_cursor": next_cursor
+    }
+
+@app.get("/cache-stats")
+async def get_cache_stats():
+    """Hit/miss counters for the frame and TTS audio caches"""
+    return {"frame_cache": frame_cache.stats(), "audio_cache": audio_cache.stats()}
+
+@app.get("/metrics")
+async def get_metrics():
+    """Stage latencies, queue depth, executor load and cache counters for Prometheus"""
+    return Response(content=render_metrics(), media_type=METRICS_CONTENT_TYPE)
 
 @app.get("/audio/{filename}")
 async def get_audio_file(filename: str):
@@ -255,15 +1126,45 @@ async def get_audio_file(filename: str):
     audio_path = os.path.join(AUDIO_FOLDER, filename)
     if not os.path.exists(audio_path):
         return {"status": "error", "message": "Audio file not found"}
-    return FileResponse(audio_path, media_type="audio/mpeg", filename=filename)
+    return FileResponse(audio_path, media_type=audio_media_type(filename), filename=filename)
+
+@app.get("/audio-stream/{filename}")
+async def stream_audio(filename: str):
+    """Stream speech for an uploaded image sentence by sentence as each one is synthesized"""
+    result = await wait_for_result(filename, lambda result: result.get("status") != "processing",
+                                   STREAM_TEXT_TIMEOUT)
+    if result is None:
+        return {"status": "not_found", "message": "Processing result not found for this filename"}
+    if result.get("status") == "processing":
+        return {"status": "not_ready", "message": "Text extraction not yet completed"}
+    # In a reading session only the words not heard before are spoken
+    text = result.get("spoken_text", result.get("text", ""))
+    if not is_speakable(text):
+        return {"status": "error", "message": "No valid text for audio generation"}
+
+    # Queue every sentence up front so synthesis runs ahead of playback
+    futures = [submit_sentence(sentence) for sentence in split_sentences(text)]
+
+    async def audio_chunks():
+        header = tts_backend.file_header()
+        if header:
+            yield header
+        for future in futures:
+            try:
+                yield await asyncio.wrap_future(future)
+            except Exception as e:
+                logger.error("❌ Streaming synthesis error for %s: %s", filename, e)
+                return
+
+    return StreamingResponse(audio_chunks(), media_type=tts_backend.media_type)
 
 @app.get("/text/{filename}")
 async def get_text_only(filename: str):
     """Get only the extracted text for a specific filename"""
-    if filename not in processing_results:
+    result = await run_blocking(processing_results.get, filename)
+    if result is None:
         return {"status": "not_found", "message": "Processing result not found for this filename"}
     
-    result = processing_results[filename]
     if result.get("status") in ["processing", "error"]:
         return {"status": "not_ready", "message": "Text extraction not yet completed"}
     
@@ -280,46 +1181,27 @@ async def get_ocr_result(filename: str):
     return await get_processing_result(filename)
 
 @app.get("/ocr-results")
-async def get_all_ocr_results():
-    return await get_all_processing_results()
+async def get_all_ocr_results(status: str = None, device_id: str = None, cursor: str = None, limit: int = 50):
+    return await get_all_processing_results(status, device_id, cursor, limit)
 
 @app.get("/tts/{filename}")
 async def tts_from_ocr(filename: str):
     return await get_audio_file(filename)
 
 @app.get("/latest-audio")
-async def get_latest_audio():
-    """Serve the most recently generated audio file."""
-    audio_files = sorted(
-        glob.glob(os.path.join(AUDIO_FOLDER, "*.mp3")),
-        key=os.path.getmtime,
-        reverse=True
-    )
-    if not audio_files:
+async def get_latest_audio(device_id: str = None):
+    """Serve the most recently generated audio file, optionally for one device."""
+    latest_audio = await run_blocking(audio_index.latest, device_id)
+    if not latest_audio:
         return {"status": "not_found", "message": "No audio files found"}
-    latest_audio = audio_files[0]
     filename = os.path.basename(latest_audio)
-    return FileResponse(latest_audio, media_type="audio/mpeg", filename=filename)
+    return FileResponse(latest_audio, media_type=audio_media_type(filename), filename=filename)
 
 @app.get("/latest-audio-filename")
-async def get_latest_audio_filename():
-    """Return the filename of the most recently generated audio file."""
-    audio_files = sorted(
-        glob.glob(os.path.join(AUDIO_FOLDER, "*.mp3")),
-        key=os.path.getmtime,
-        reverse=True
-    )
-    if not audio_files:
+async def get_latest_audio_filename(device_id: str = None):
+    """Return the filename of the most recently generated audio file, optionally for one device."""
+    latest_audio = await run_blocking(audio_index.latest, device_id)
+    if not latest_audio:
         return {"status": "not_found", "message": "No audio files found"}
-    latest_audio = os.path.basename(audio_files[0])
-    return {"filename": latest_audio}
+    return {"filename": os.path.basename(latest_audio)}
 
-if __name__ == "__main__":
-    import uvicorn
-    ip = socket.gethostbyname(socket.gethostname())
-    print(f"📡 Your local IP address: http://{ip}:8000")
-    print("🔍 OCR + TTS Integrated Processing Enabled!")
-    print("📝 Text extraction and audio generation happen automatically in single pipeline")
-    print("⚡ Asynchronous processing enabled - no delays!")
-    print("🎵 Audio files are generated automatically after text extraction")
-    uvicorn.run("main:app", host="0.0.0.0", port=8000)
\ No newline at end of file
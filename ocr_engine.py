@@ -0,0 +1,267 @@
+"""
+Resident Tesseract OCR engine.
+
+pytesseract launches a fresh `tesseract` process for every call, writes the
+image to a temp file and reloads the traineddata each time. This module talks
+to libtesseract through its C API instead, so the language model is loaded
+once per worker thread and preprocessed numpy buffers are handed to the
+engine directly from memory.
+
+If libtesseract cannot be located the engine falls back to pytesseract, which
+keeps the same interface but pays the subprocess cost on every call.
+"""
+import ctypes
+import ctypes.util
+import logging
+import os
+import threading
+
+import numpy as np
+import pytesseract
+
+logger = logging.getLogger(__name__)
+
+# Engine configuration
+TESSERACT_LANG = os.environ.get("TESSERACT_LANG", "eng")
+TESSDATA_PATH = os.environ.get("TESSDATA_PREFIX")
+TESSERACT_LIBRARY = os.environ.get("TESSERACT_LIBRARY")  # explicit path to libtesseract, optional
+TESSERACT_DPI = 300
+
+# Tesseract C API enums
+OEM_DEFAULT = 3
+RIL_TEXTLINE = 2
+RIL_WORD = 3
+
+_LIBRARY_CANDIDATES = [
+    "libtesseract.so.5",
+    "libtesseract.so.4",
+    "libtesseract.5.dylib",
+    "libtesseract-5.dll",
+    "libtesseract-4.dll",
+]
+
+
+def _load_libtesseract():
+    """Locate and load libtesseract, returning None when it is not installed"""
+    candidates = [TESSERACT_LIBRARY, ctypes.util.find_library("tesseract")] + _LIBRARY_CANDIDATES
+    for name in candidates:
+        if not name:
+            continue
+        try:
+            lib = ctypes.CDLL(name)
+        except OSError:
+            continue
+        _declare_signatures(lib)
+        return lib
+    return None
+
+
+def _declare_signatures(lib):
+    """Declare argument/return types for the C API functions we use"""
+    handle = ctypes.c_void_p
+    lib.TessBaseAPICreate.restype = handle
+    lib.TessBaseAPICreate.argtypes = []
+    lib.TessBaseAPIInit2.restype = ctypes.c_int
+    lib.TessBaseAPIInit2.argtypes = [handle, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int]
+    lib.TessBaseAPISetPageSegMode.restype = None
+    lib.TessBaseAPISetPageSegMode.argtypes = [handle, ctypes.c_int]
+    lib.TessBaseAPISetImage.restype = None
+    lib.TessBaseAPISetImage.argtypes = [handle, ctypes.c_void_p, ctypes.c_int, ctypes.c_int,
+                                        ctypes.c_int, ctypes.c_int]
+    lib.TessBaseAPISetSourceResolution.restype = None
+    lib.TessBaseAPISetSourceResolution.argtypes = [handle, ctypes.c_int]
+    lib.TessBaseAPIRecognize.restype = ctypes.c_int
+    lib.TessBaseAPIRecognize.argtypes = [handle, ctypes.c_void_p]
+    lib.TessBaseAPIGetUTF8Text.restype = ctypes.c_void_p
+    lib.TessBaseAPIGetUTF8Text.argtypes = [handle]
+    lib.TessBaseAPIGetIterator.restype = handle
+    lib.TessBaseAPIGetIterator.argtypes = [handle]
+    lib.TessBaseAPIClear.restype = None
+    lib.TessBaseAPIClear.argtypes = [handle]
+    lib.TessBaseAPIEnd.restype = None
+    lib.TessBaseAPIEnd.argtypes = [handle]
+    lib.TessBaseAPIDelete.restype = None
+    lib.TessBaseAPIDelete.argtypes = [handle]
+    lib.TessDeleteText.restype = None
+    lib.TessDeleteText.argtypes = [ctypes.c_void_p]
+    lib.TessResultIteratorGetUTF8Text.restype = ctypes.c_void_p
+    lib.TessResultIteratorGetUTF8Text.argtypes = [handle, ctypes.c_int]
+    lib.TessResultIteratorConfidence.restype = ctypes.c_float
+    lib.TessResultIteratorConfidence.argtypes = [handle, ctypes.c_int]
+    lib.TessResultIteratorNext.restype = ctypes.c_int
+    lib.TessResultIteratorNext.argtypes = [handle, ctypes.c_int]
+    lib.TessResultIteratorGetPageIteratorConst.restype = handle
+    lib.TessResultIteratorGetPageIteratorConst.argtypes = [handle]
+    lib.TessResultIteratorDelete.restype = None
+    lib.TessResultIteratorDelete.argtypes = [handle]
+    lib.TessPageIteratorBoundingBox.restype = ctypes.c_int
+    lib.TessPageIteratorBoundingBox.argtypes = [handle, ctypes.c_int] + [ctypes.POINTER(ctypes.c_int)] * 4
+    lib.TessPageIteratorIsAtBeginningOf.restype = ctypes.c_int
+    lib.TessPageIteratorIsAtBeginningOf.argtypes = [handle, ctypes.c_int]
+
+
+_lib = _load_libtesseract()
+
+
+def _as_gray_buffer(image):
+    """Return a C-contiguous uint8 grayscale array for the given image"""
+    array = np.asarray(image)
+    if array.ndim == 3:
+        # Convert BGR/RGB to luminance without pulling in cv2 here
+        array = array[..., :3].mean(axis=2)
+    if array.dtype != np.uint8:
+        array = np.clip(array, 0, 255).astype(np.uint8)
+    return np.ascontiguousarray(array)
+
+
+class TesseractEngine:
+    """A single libtesseract instance with the language model kept loaded in memory"""
+
+    resident = True
+
+    def __init__(self, lang=TESSERACT_LANG, datapath=TESSDATA_PATH):
+        if _lib is None:
+            raise RuntimeError("libtesseract not found")
+        self._handle = _lib.TessBaseAPICreate()
+        path = datapath.encode() if datapath else None
+        if _lib.TessBaseAPIInit2(self._handle, path, lang.encode(), OEM_DEFAULT) != 0:
+            _lib.TessBaseAPIDelete(self._handle)
+            self._handle = None
+            raise RuntimeError(f"Could not initialise Tesseract for language '{lang}'")
+
+    def _recognize(self, image, psm):
+        """Load the buffer into the engine and run recognition with the given page segmentation mode"""
+        buffer = _as_gray_buffer(image)
+        height, width = buffer.shape
+        _lib.TessBaseAPISetPageSegMode(self._handle, psm)
+        _lib.TessBaseAPISetImage(self._handle, buffer.ctypes.data, width, height, 1, buffer.strides[0])
+        _lib.TessBaseAPISetSourceResolution(self._handle, TESSERACT_DPI)
+        if _lib.TessBaseAPIRecognize(self._handle, None) != 0:
+            raise RuntimeError("Tesseract recognition failed")
+        return buffer
+
+    def image_to_string(self, image, psm):
+        """Recognise the image and return its text"""
+        buffer = self._recognize(image, psm)
+        text_ptr = _lib.TessBaseAPIGetUTF8Text(self._handle)
+        try:
+            return ctypes.string_at(text_ptr).decode("utf-8", errors="ignore") if text_ptr else ""
+        finally:
+            if text_ptr:
+                _lib.TessDeleteText(text_ptr)
+            _lib.TessBaseAPIClear(self._handle)
+            del buffer
+
+    def image_to_data(self, image, psm):
+        """
+        Recognise the image and return one dict per word with its text,
+        confidence (0-100), bounding box and text-line index.
+        """
+        buffer = self._recognize(image, psm)
+        words = []
+        iterator = _lib.TessBaseAPIGetIterator(self._handle)
+        try:
+            if not iterator:
+                return words
+            page_iterator = _lib.TessResultIteratorGetPageIteratorConst(iterator)
+            left, top, right, bottom = (ctypes.c_int() for _ in range(4))
+            line = -1
+            while True:
+                if _lib.TessPageIteratorIsAtBeginningOf(page_iterator, RIL_TEXTLINE):
+                    line += 1
+                text_ptr = _lib.TessResultIteratorGetUTF8Text(iterator, RIL_WORD)
+                if text_ptr:
+                    text = ctypes.string_at(text_ptr).decode("utf-8", errors="ignore")
+                    _lib.TessDeleteText(text_ptr)
+                    _lib.TessPageIteratorBoundingBox(page_iterator, RIL_WORD, ctypes.byref(left),
+                                                     ctypes.byref(top), ctypes.byref(right), ctypes.byref(bottom))
+                    if text.strip():
+                        words.append({
+                            "text": text,
+                            "conf": float(_lib.TessResultIteratorConfidence(iterator, RIL_WORD)),
+                            "left": left.value,
+                            "top": top.value,
+                            "width": right.value - left.value,
+                            "height": bottom.value - top.value,
+                            "line": max(line, 0),
+                        })
+                if not _lib.TessResultIteratorNext(iterator, RIL_WORD):
+                    break
+            return words
+        finally:
+            if iterator:
+                _lib.TessResultIteratorDelete(iterator)
+            _lib.TessBaseAPIClear(self._handle)
+            del buffer
+
+    def close(self):
+        """Release the native engine"""
+        if self._handle:
+            _lib.TessBaseAPIEnd(self._handle)
+            _lib.TessBaseAPIDelete(self._handle)
+            self._handle = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class PytesseractEngine:
+    """Fallback engine with the same interface, backed by the pytesseract subprocess wrapper"""
+
+    resident = False
+
+    def __init__(self, lang=TESSERACT_LANG):
+        self.lang = lang
+
+    def _config(self, psm):
+        return f"--oem {OEM_DEFAULT} --psm {psm}"
+
+    def image_to_string(self, image, psm):
+        return pytesseract.image_to_string(_as_gray_buffer(image), lang=self.lang, config=self._config(psm))
+
+    def image_to_data(self, image, psm):
+        data = pytesseract.image_to_data(_as_gray_buffer(image), lang=self.lang, config=self._config(psm),
+                                         output_type=pytesseract.Output.DICT)
+        words = []
+        line_keys = {}
+        for i, text in enumerate(data["text"]):
+            if not text.strip():
+                continue
+            line_key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+            words.append({
+                "text": text,
+                "conf": float(data["conf"][i]),
+                "left": data["left"][i],
+                "top": data["top"][i],
+                "width": data["width"][i],
+                "height": data["height"][i],
+                "line": line_keys.setdefault(line_key, len(line_keys)),
+            })
+        return words
+
+    def close(self):
+        pass
+
+
+_local = threading.local()
+
+
+def get_tesseract_engine():
+    """
+    Return the calling thread's resident Tesseract engine, creating it on first use.
+
+    libtesseract handles are not thread-safe, so each executor thread keeps
+    its own instance for the lifetime of the process.
+    """
+    engine = getattr(_local, "engine", None)
+    if engine is None:
+        try:
+            engine = TesseractEngine()
+        except RuntimeError as e:
+            logger.warning("Resident Tesseract unavailable (%s), falling back to pytesseract", e)
+            engine = PytesseractEngine()
+        _local.engine = engine
+    return engine
@@ -0,0 +1,337 @@
+"""
+OCR stage of the pipeline: text-region detection, preprocessing, Tesseract
+PSM passes and text cleanup.
+
+Kept free of web-server state so it can run either on the pipeline's worker
+threads or inside an OCR process pool. In the process pool, decoded frames
+are handed over through multiprocessing.shared_memory instead of being
+pickled.
+
+Stage and per-pass timings are returned with the result info rather than
+recorded here, so they survive the trip back from a pool process.
+"""
+import os
+import re
+import time
+from collections import Counter
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from ocr_engine import get_tesseract_engine
+from text_align import merge_transcripts
+from text_regions import detect_text_regions, estimate_text_height, bounding_box, TEXT_MAX_REGIONS
+
+# Tesseract page segmentation modes, most likely first
+OCR_PSM_MODES = (6, 8, 13)
+# Modes for a single detected text line: PSM 7 treats the crop as one line
+OCR_LINE_PSM_MODES = (7, 13, 6)
+
+# OCR strategy: "cascade" stops at the first PSM whose result is confident
+# enough, "all" always runs every PSM and merges the output into a consensus
+OCR_MODE = os.environ.get("OCR_MODE", "cascade")
+OCR_CASCADE_MIN_CONFIDENCE = float(os.environ.get("OCR_CASCADE_MIN_CONFIDENCE", "70"))
+OCR_CASCADE_MIN_WORDS = int(os.environ.get("OCR_CASCADE_MIN_WORDS", "3"))
+# A line crop may hold a single word ("EXIT"), so one confident word ends its cascade
+OCR_LINE_MIN_WORDS = int(os.environ.get("OCR_LINE_MIN_WORDS", "1"))
+
+# Where Tesseract looks: "regions" OCRs only the detected text lines in
+# reading order, "crop" binarizes a fixed window of the whole frame
+TEXT_DETECTION = os.environ.get("TEXT_DETECTION", "regions")
+
+# Frames are resized so the dominant character height lands near the size
+# Tesseract reads best; the preprocessing kernels below were tuned for it
+OCR_TARGET_TEXT_HEIGHT = float(os.environ.get("OCR_TARGET_TEXT_HEIGHT", "32"))  # pixels
+OCR_MIN_SCALE = float(os.environ.get("OCR_MIN_SCALE", "0.25"))
+OCR_MAX_SCALE = float(os.environ.get("OCR_MAX_SCALE", "4"))
+# Scales this close to 1 are not worth a resize
+_SCALE_TOLERANCE = 0.15
+
+# White margin around each region crop; Tesseract misreads glyphs touching the edge
+REGION_BORDER = 10
+
+NO_TEXT_MESSAGE = "No text detected in the image"
+
+
+def normalize_text_scale(gray):
+    """
+    Resize a grayscale image so its text is about OCR_TARGET_TEXT_HEIGHT
+    pixels tall: large text is shrunk, which makes every later stage
+    cheaper, and tiny text is enlarged for accuracy.
+
+    Returns (image, scale, estimated text height before scaling or None).
+    """
+    text_height = estimate_text_height(gray)
+    if text_height is None:
+        return gray, 1.0, None
+    scale = min(max(OCR_TARGET_TEXT_HEIGHT / text_height, OCR_MIN_SCALE), OCR_MAX_SCALE)
+    if abs(scale - 1.0) < _SCALE_TOLERANCE:
+        return gray, 1.0, text_height
+    interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_CUBIC
+    return cv2.resize(gray, None, fx=scale, fy=scale, interpolation=interpolation), scale, text_height
+
+
+def _kernel_size(size_at_target, text_height, minimum=3):
+    """Odd kernel size scaled from its tuned value at the target text height"""
+    size = max(minimum, int(round(size_at_target * text_height / OCR_TARGET_TEXT_HEIGHT)))
+    return size if size % 2 else size + 1
+
+
+def binarize_for_ocr(gray, text_height=None):
+    """
+    Denoise and binarize a grayscale image for Tesseract, with kernels sized
+    for `text_height` (pixels, defaults to the target height)
+    """
+    text_height = text_height or OCR_TARGET_TEXT_HEIGHT
+    blur = _kernel_size(5, text_height)
+    block = _kernel_size(11, text_height)
+    morph = _kernel_size(3, text_height, minimum=1)
+    blurred = cv2.GaussianBlur(gray, (blur, blur), 0)
+    binary = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                   cv2.THRESH_BINARY, block, 2)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (morph, morph))
+    cleaned = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel)
+    cleaned = cv2.morphologyEx(cleaned, cv2.MORPH_OPEN, kernel)
+    return cleaned
+
+
+def _scale_info(scale, text_height):
+    return {"ocr_scale": round(scale, 3),
+            "ocr_text_height": round(text_height, 1) if text_height is not None else None}
+
+
+def _scaled_text_height(scale, text_height):
+    return text_height * scale if text_height is not None else None
+
+
+def preprocess_for_ocr(image):
+    """
+    Crop, rescale and binarize a BGR frame for Tesseract. Returns the binary
+    image and the scale info.
+    """
+    # 🪄 Crop image to remove header, side UI noise
+    h, w, _ = image.shape
+    cropped = image[int(h*0.2):int(h*0.95), int(w*0.05):int(w*0.95)]
+
+    # Preprocess image
+    gray = cv2.cvtColor(cropped, cv2.COLOR_BGR2GRAY)
+    gray, scale, text_height = normalize_text_scale(gray)
+    return binarize_for_ocr(gray, _scaled_text_height(scale, text_height)), _scale_info(scale, text_height)
+
+
+def clean_ocr_text(text):
+    """Collapse whitespace and drop non-ASCII characters from OCR output"""
+    cleaned_text = ' '.join(text.split())
+    return re.sub(r'[^\x00-\x7F]+', '', cleaned_text)  # remove non-ASCII
+
+
+def _score_words(words):
+    """Mean word confidence (0-100) of a Tesseract word list"""
+    confidences = [word["conf"] for word in words if word["conf"] >= 0]
+    return sum(confidences) / len(confidences) if confidences else 0.0
+
+
+def _new_timings():
+    return {"stages": {"preprocess": 0.0, "text_detection": 0.0}, "passes": []}
+
+
+def _image_to_data(engine, image, psm, timings):
+    start = time.perf_counter()
+    try:
+        return engine.image_to_data(image, psm)
+    finally:
+        timings["passes"].append((psm, time.perf_counter() - start))
+
+
+def _run_psm_cascade(engine, image, timings, psm_modes=OCR_PSM_MODES, min_words=OCR_CASCADE_MIN_WORDS):
+    """
+    Run the PSM modes in order with image_to_data and stop as soon as one
+    reaches the confidence and word-count thresholds. If none does, the
+    best-scoring pass wins.
+    """
+    best = None
+    passes = 0
+    for psm in psm_modes:
+        passes += 1
+        try:
+            words = _image_to_data(engine, image, psm, timings)
+        except Exception:
+            continue
+
+        confidence = _score_words(words)
+        # Cap the word-count bonus so long noisy passes can't outvote a clean one
+        score = confidence * min(len(words), OCR_CASCADE_MIN_WORDS)
+        if best is None or score > best["score"]:
+            best = {"psm": psm, "words": words, "confidence": confidence, "score": score}
+
+        if confidence >= OCR_CASCADE_MIN_CONFIDENCE and len(words) >= min_words:
+            break
+
+    info = {"ocr_mode": "cascade", "ocr_passes": passes, "ocr_psm": None, "ocr_confidence": None}
+    if best is None or not best["words"]:
+        return "", info
+
+    info.update({"ocr_psm": best["psm"], "ocr_confidence": round(best["confidence"], 1)})
+    return ' '.join(word["text"] for word in best["words"]), info
+
+
+def _run_all_psms(engine, image, timings, psm_modes=OCR_PSM_MODES):
+    """
+    Run every PSM mode and merge the results into one consensus transcript,
+    so text recognised by several passes is only spoken once
+    """
+    candidates = []
+    for psm in psm_modes:
+        try:
+            words = _image_to_data(engine, image, psm, timings)
+            if words:
+                candidates.append(words)
+        except:
+            continue
+    info = {"ocr_mode": "all", "ocr_passes": len(psm_modes), "ocr_psm": None, "ocr_confidence": None,
+            "ocr_candidates": len(candidates)}
+    return ' '.join(merge_transcripts(candidates)), info
+
+
+def _run_passes(engine, image, timings, line=False):
+    """OCR a page, or with `line` set a single text-line crop"""
+    psm_modes = OCR_LINE_PSM_MODES if line else OCR_PSM_MODES
+    if OCR_MODE == "all":
+        return _run_all_psms(engine, image, timings, psm_modes)
+    return _run_psm_cascade(engine, image, timings, psm_modes,
+                            OCR_LINE_MIN_WORDS if line else OCR_CASCADE_MIN_WORDS)
+
+
+def _ocr_text_regions(engine, image, timings):
+    """
+    Detect text lines and OCR each crop in reading order. Frames without
+    any text-like region never reach Tesseract. Line crops use the line
+    PSM modes, so a confidently read line costs a single pass.
+    """
+    start = time.perf_counter()
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    gray, scale, text_height = normalize_text_scale(gray)
+    scaled_height = _scaled_text_height(scale, text_height)
+    timings["stages"]["preprocess"] += time.perf_counter() - start
+    start = time.perf_counter()
+    regions = detect_text_regions(gray)
+    timings["stages"]["text_detection"] += time.perf_counter() - start
+    lines = len(regions) <= TEXT_MAX_REGIONS
+    if not lines:
+        # Dense page: one crop around all of it beats dozens of small passes
+        regions = [bounding_box(regions)]
+
+    region_area = sum(w * h for _, _, w, h in regions)
+    info = {"ocr_mode": OCR_MODE, "ocr_passes": 0, "ocr_psm": None, "ocr_confidence": None,
+            "ocr_regions": len(regions), "ocr_area_fraction": round(region_area / float(gray.size), 3),
+            **_scale_info(scale, text_height)}
+
+    texts = []
+    psms = Counter()
+    confidence_sum = 0.0
+    confident_words = 0
+    for x, y, w, h in regions:
+        start = time.perf_counter()
+        binary = binarize_for_ocr(gray[y:y + h, x:x + w], scaled_height)
+        binary = cv2.copyMakeBorder(binary, REGION_BORDER, REGION_BORDER, REGION_BORDER, REGION_BORDER,
+                                    cv2.BORDER_CONSTANT, value=255)
+        timings["stages"]["preprocess"] += time.perf_counter() - start
+        text, region_info = _run_passes(engine, binary, timings, line=lines)
+        info["ocr_passes"] += region_info["ocr_passes"]
+        if not text:
+            continue
+        texts.append(text)
+        if region_info["ocr_psm"] is not None:
+            psms[region_info["ocr_psm"]] += 1
+        if region_info["ocr_confidence"] is not None:
+            words = len(text.split())
+            confidence_sum += region_info["ocr_confidence"] * words
+            confident_words += words
+
+    if psms:
+        info["ocr_psm"] = psms.most_common(1)[0][0]
+    if confident_words:
+        info["ocr_confidence"] = round(confidence_sum / confident_words, 1)
+    return ' '.join(texts), info
+
+
+def decode_image(data):
+    """Decode encoded image bytes straight from memory into a BGR array (None if undecodable)"""
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def extract_text_with_info(image):
+    """
+    Extract text from an image and report how it was obtained.
+
+    `image` is either a path on disk or an already decoded BGR array.
+    Returns (text, info) where info holds the OCR mode, the winning PSM,
+    the number of Tesseract passes that ran and, under "ocr_timings", the
+    seconds spent per stage and per pass.
+    """
+    info = {"ocr_mode": OCR_MODE, "ocr_passes": 0, "ocr_psm": None, "ocr_confidence": None}
+    try:
+        if isinstance(image, str):
+            image = cv2.imread(image)
+        if image is None:
+            return "Error: Could not read image", info
+
+        # PSM passes run on this thread's resident Tesseract engine straight
+        # from the numpy buffer
+        engine = get_tesseract_engine()
+        timings = _new_timings()
+        if TEXT_DETECTION == "crop":
+            start = time.perf_counter()
+            binary, scale_info = preprocess_for_ocr(image)
+            timings["stages"]["preprocess"] = time.perf_counter() - start
+            text, info = _run_passes(engine, binary, timings)
+            info.update(scale_info)
+        else:
+            text, info = _ocr_text_regions(engine, image, timings)
+        info["ocr_timings"] = timings
+
+        cleaned_text = clean_ocr_text(text)
+        if cleaned_text:
+            return cleaned_text, info
+        else:
+            return NO_TEXT_MESSAGE, info
+
+    except Exception as e:
+        return f"OCR Error: {str(e)}", info
+
+
+def init_ocr_worker():
+    """Process-pool initializer: load the resident Tesseract engine before the first frame"""
+    get_tesseract_engine()
+
+
+def _extract_text_from_shared_frame(name, shape, dtype):
+    """Process-pool entry point: OCR a frame that the parent placed in shared memory"""
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        image = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        try:
+            return extract_text_with_info(image)
+        finally:
+            # The view must be gone before the segment can be closed
+            del image
+    finally:
+        shm.close()
+
+
+def extract_text_in_pool(pool, image):
+    """
+    Run extract_text_with_info in a process pool, handing the decoded frame
+    over through shared memory. Blocks until the result is ready.
+    """
+    if image is None:
+        return extract_text_with_info(image)
+    shm = shared_memory.SharedMemory(create=True, size=max(image.nbytes, 1))
+    try:
+        np.ndarray(image.shape, dtype=image.dtype, buffer=shm.buf)[...] = image
+        future = pool.submit(_extract_text_from_shared_frame, shm.name, image.shape, image.dtype.str)
+        return future.result()
+    finally:
+        shm.close()
+        shm.unlink()
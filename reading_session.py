@@ -0,0 +1,92 @@
+"""
+Per-device reading sessions for "read only what's new".
+
+When the wearer scans down a page or along a shelf, consecutive captures
+share most of their text. A session remembers the recent transcript of a
+device so each new capture can be aligned against it and only the words
+not read before are synthesized. Sessions expire after a period without
+captures.
+
+When several server processes share state, sessions live in the shared
+backend so a device's captures may land on any process.
+"""
+import json
+import os
+import threading
+import time
+
+from text_align import new_words
+
+SESSION_TTL = float(os.environ.get("SESSION_TTL", "300"))              # seconds without a capture
+SESSION_MAX_WORDS = int(os.environ.get("SESSION_MAX_WORDS", "400"))    # history kept per device
+SESSION_MIN_MATCH = int(os.environ.get("SESSION_MIN_MATCH", "2"))      # words in a run counted as overlap
+
+# Session modes accepted by /upload
+SESSION_MODES = ("incremental", "repeat")
+
+
+class ReadingSessions:
+    """Recent transcript history per device"""
+
+    def __init__(self, ttl=SESSION_TTL, max_words=SESSION_MAX_WORDS, min_match=SESSION_MIN_MATCH, shared=None):
+        self.ttl = ttl
+        self.max_words = max_words
+        self.min_match = min_match
+        self.shared = shared
+        self._sessions = {}  # device_id -> (updated_at, history text)
+        self._lock = threading.Lock()
+
+    def _load(self, device_id):
+        if self.shared is not None:
+            stored = self.shared.get_value(f"session:{device_id}")
+            entry = json.loads(stored) if stored else None
+        else:
+            entry = self._sessions.get(device_id)
+        if entry is None or time.time() - entry[0] > self.ttl:
+            return ""
+        return entry[1]
+
+    def _store(self, device_id, history):
+        entry = (time.time(), history)
+        if self.shared is not None:
+            self.shared.set_value(f"session:{device_id}", json.dumps(entry))
+        else:
+            self._sessions[device_id] = entry
+            self._expire(entry[0])
+
+    def _expire(self, now):
+        for device_id in [d for d, (updated_at, _) in self._sessions.items() if now - updated_at > self.ttl]:
+            del self._sessions[device_id]
+
+    def unread(self, device_id, text, repeat=False):
+        """
+        The text of a capture to speak without recording it as heard: only
+        the new words, or all of it when `repeat` is set or the session is
+        fresh. Call `advance` once the words have actually been spoken.
+        """
+        with self._lock:
+            history = self._load(device_id)
+            return text if repeat or not history else ' '.join(new_words(history, text, self.min_match))
+
+    def advance(self, device_id, text, repeat=False):
+        """
+        Add a capture's transcript to the device's session and return the
+        text to speak: only the new words, or all of it when `repeat` is set
+        or the session is fresh.
+        """
+        with self._lock:
+            history = self._load(device_id)
+            fresh = new_words(history, text, self.min_match)
+            words = history.split() + fresh
+            self._store(device_id, ' '.join(words[-self.max_words:]))
+            return text if repeat or not history else ' '.join(fresh)
+
+    def reset(self, device_id):
+        with self._lock:
+            if self.shared is not None:
+                self.shared.set_value(f"session:{device_id}", "")
+            else:
+                self._sessions.pop(device_id, None)
+
+    def __len__(self):
+        return len(self._sessions)
@@ -0,0 +1,61 @@
+"""
+Push notifications for processing-result state transitions.
+
+The pipeline runs on worker threads while SSE, WebSocket and long-poll
+clients wait on the event loop. publish() is thread-safe and hands each
+event to every subscriber's asyncio.Queue on that subscriber's own loop.
+"""
+import asyncio
+import threading
+
+# States after which a job will not change any more
+TERMINAL_STATES = {"completed", "ocr_only", "error", "cancelled", "rejected"}
+
+
+class ResultEvents:
+    """Fan-out of per-filename state events to asyncio subscribers"""
+
+    def __init__(self, queue_size=32):
+        self.queue_size = queue_size
+        self._subscribers = {}  # filename -> set of (loop, queue)
+        self._lock = threading.Lock()
+
+    def subscribe(self, filename):
+        """Register the calling coroutine for events about a filename and return its queue"""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        subscriber = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._subscribers.setdefault(filename, set()).add(subscriber)
+        return queue
+
+    def unsubscribe(self, filename, queue):
+        with self._lock:
+            subscribers = self._subscribers.get(filename)
+            if not subscribers:
+                return
+            subscribers.difference_update({s for s in subscribers if s[1] is queue})
+            if not subscribers:
+                del self._subscribers[filename]
+
+    def publish(self, filename, state, result):
+        """Deliver a state transition to every subscriber; safe to call from any thread"""
+        event = {"filename": filename, "state": state, "result": result}
+        with self._lock:
+            subscribers = list(self._subscribers.get(filename, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, event)
+            except RuntimeError:
+                # Subscriber's loop has already shut down
+                self.unsubscribe(filename, queue)
+
+    @staticmethod
+    def _offer(queue, event):
+        # A slow subscriber only needs the latest state, so drop the oldest
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
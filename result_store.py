@@ -0,0 +1,268 @@
+"""
+Bounded storage for processing results.
+
+The in-memory tier keeps recent results with a size cap and TTL, so memory
+stays flat over long uptimes. An optional SQLite tier persists every result
+across restarts and serves filtered, cursor-paginated listings from indexes
+on creation time, status and device.
+
+Listings are ordered newest first. Cursors are opaque strings encoding the
+(created_at, filename) of the last item returned.
+"""
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+RESULT_STORE = os.environ.get("RESULT_STORE", "memory")  # "memory" or "sqlite"
+RESULT_DB_PATH = os.environ.get("RESULT_DB_PATH", "processing_results.db")
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", "1000"))
+RESULT_TTL = float(os.environ.get("RESULT_TTL", str(24 * 3600)))  # seconds in memory
+RESULT_DB_RETENTION = float(os.environ.get("RESULT_DB_RETENTION", str(30 * 24 * 3600)))  # seconds on disk
+
+
+def encode_cursor(created_at, filename):
+    return f"{created_at!r}|{filename}"
+
+
+def decode_cursor(cursor):
+    """Return (created_at, filename) from a cursor, or None for the first page; ValueError if malformed"""
+    if not cursor:
+        return None
+    created_at, separator, filename = cursor.partition("|")
+    try:
+        created_at = float(created_at)
+    except ValueError:
+        created_at = None
+    if not separator or created_at is None or not math.isfinite(created_at):
+        raise ValueError(f"Invalid cursor '{cursor}'")
+    return created_at, filename
+
+
+class MemoryResultStore:
+    """Thread-safe result dict capped by entry count and age, oldest evicted first"""
+
+    def __init__(self, max_entries=RESULT_CACHE_SIZE, ttl=RESULT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # filename -> (created_at, updated_at, result), creation order
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        while self._entries:
+            filename, (created_at, updated_at, _) = next(iter(self._entries.items()))
+            if len(self._entries) > self.max_entries or now - updated_at > self.ttl:
+                del self._entries[filename]
+            else:
+                break
+
+    def get(self, filename):
+        with self._lock:
+            entry = self._entries.get(filename)
+            if entry is None or time.time() - entry[1] > self.ttl:
+                return None
+            return dict(entry[2])
+
+    def put(self, filename, result):
+        """Replace the result for a filename and return a copy of it"""
+        now = time.time()
+        with self._lock:
+            created_at = self._entries[filename][0] if filename in self._entries else now
+            self._entries[filename] = (created_at, now, dict(result))
+            self._evict(now)
+            return dict(result)
+
+    def update(self, filename, fields):
+        """Merge fields into the result for a filename and return a copy of the merged result"""
+        now = time.time()
+        with self._lock:
+            created_at, _, result = self._entries.get(filename, (now, now, {}))
+            result = dict(result, **fields)
+            self._entries[filename] = (created_at, now, result)
+            self._evict(now)
+            return dict(result)
+
+    def delete(self, filename):
+        with self._lock:
+            self._entries.pop(filename, None)
+
+    def list(self, status=None, device_id=None, cursor=None, limit=50):
+        """Return (results, next_cursor) newest first, optionally filtered by status and device"""
+        after = decode_cursor(cursor)
+        now = time.time()
+        page = []
+        next_cursor = None
+        with self._lock:
+            for filename in reversed(self._entries):
+                created_at, updated_at, result = self._entries[filename]
+                if after is not None and (created_at, filename) >= after:
+                    continue
+                if now - updated_at > self.ttl:
+                    continue
+                if status is not None and result.get("status") != status:
+                    continue
+                if device_id is not None and result.get("device_id") != device_id:
+                    continue
+                if len(page) == limit:
+                    next_cursor = encode_cursor(*page[-1][:2])
+                    break
+                page.append((created_at, filename, dict(result)))
+        return [(filename, result) for _, filename, result in page], next_cursor
+
+    def __contains__(self, filename):
+        return self.get(filename) is not None
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteResultStore:
+    """Persistent result store backed by a single SQLite file"""
+
+    # Run the retention purge roughly once every this many writes
+    PURGE_EVERY = 500
+
+    def __init__(self, path=RESULT_DB_PATH, retention=RESULT_DB_RETENTION):
+        self.path = path
+        self.retention = retention
+        self._local = threading.local()
+        self._writes = 0
+        with self.connection() as db:
+            db.executescript("""
+                CREATE TABLE IF NOT EXISTS results (
+                    filename   TEXT PRIMARY KEY,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    status     TEXT,
+                    device_id  TEXT,
+                    data       TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS results_created ON results (created_at, filename);
+                CREATE INDEX IF NOT EXISTS results_status ON results (status, created_at);
+                CREATE INDEX IF NOT EXISTS results_device ON results (device_id, created_at);
+                CREATE INDEX IF NOT EXISTS results_updated ON results (updated_at);
+            """)
+
+    def connection(self):
+        """One connection per thread; WAL lets readers proceed while a worker writes"""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def get(self, filename):
+        row = self.connection().execute("SELECT data FROM results WHERE filename = ?", (filename,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _write(self, db, filename, result, now):
+        db.execute(
+            """INSERT INTO results (filename, created_at, updated_at, status, device_id, data)
+               VALUES (?, ?, ?, ?, ?, ?)
+               ON CONFLICT(filename) DO UPDATE SET
+                   updated_at = excluded.updated_at, status = excluded.status,
+                   device_id = COALESCE(excluded.device_id, results.device_id), data = excluded.data""",
+            (filename, now, now, result.get("status"), result.get("device_id"), json.dumps(result)))
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            db.execute("DELETE FROM results WHERE updated_at < ?", (now - self.retention,))
+
+    def put(self, filename, result):
+        db = self.connection()
+        with db:
+            self._write(db, filename, result, time.time())
+        return dict(result)
+
+    def update(self, filename, fields):
+        db = self.connection()
+        # BEGIN IMMEDIATE serialises read-modify-write across threads and processes
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute("SELECT data FROM results WHERE filename = ?", (filename,)).fetchone()
+            result = dict(json.loads(row[0]) if row else {}, **fields)
+            self._write(db, filename, result, time.time())
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return result
+
+    def delete(self, filename):
+        self.connection().execute("DELETE FROM results WHERE filename = ?", (filename,))
+
+    def list(self, status=None, device_id=None, cursor=None, limit=50):
+        clauses, params = [], []
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(status)
+        if device_id is not None:
+            clauses.append("device_id = ?")
+            params.append(device_id)
+        after = decode_cursor(cursor)
+        if after is not None:
+            clauses.append("(created_at, filename) < (?, ?)")
+            params.extend(after)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self.connection().execute(
+            f"SELECT created_at, filename, data FROM results {where} "
+            f"ORDER BY created_at DESC, filename DESC LIMIT ?", params + [limit + 1]).fetchall()
+        next_cursor = encode_cursor(rows[limit - 1][0], rows[limit - 1][1]) if len(rows) > limit else None
+        return [(filename, json.loads(data)) for _, filename, data in rows[:limit]], next_cursor
+
+    def __contains__(self, filename):
+        return self.connection().execute("SELECT 1 FROM results WHERE filename = ?", (filename,)).fetchone() is not None
+
+    def __len__(self):
+        return self.connection().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+
+class TieredResultStore:
+    """Memory tier in front of a persistent tier; writes go through to both"""
+
+    def __init__(self, memory, persistent):
+        self.memory = memory
+        self.persistent = persistent
+
+    def get(self, filename):
+        result = self.memory.get(filename)
+        if result is None:
+            result = self.persistent.get(filename)
+            if result is not None:
+                self.memory.put(filename, result)
+        return result
+
+    def put(self, filename, result):
+        self.persistent.put(filename, result)
+        return self.memory.put(filename, result)
+
+    def update(self, filename, fields):
+        result = self.persistent.update(filename, fields)
+        return self.memory.put(filename, result)
+
+    def delete(self, filename):
+        self.persistent.delete(filename)
+        self.memory.delete(filename)
+
+    def list(self, status=None, device_id=None, cursor=None, limit=50):
+        # The persistent tier holds the complete history
+        return self.persistent.list(status=status, device_id=device_id, cursor=cursor, limit=limit)
+
+    def __contains__(self, filename):
+        return self.get(filename) is not None
+
+    def __len__(self):
+        return len(self.persistent)
+
+
+def create_result_store(kind=RESULT_STORE):
+    """Build the configured result store"""
+    if kind == "memory":
+        return MemoryResultStore()
+    if kind == "sqlite":
+        return TieredResultStore(MemoryResultStore(), SQLiteResultStore())
+    raise ValueError(f"Unknown result store '{kind}', expected 'memory' or 'sqlite'")
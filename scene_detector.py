@@ -0,0 +1,123 @@
+"""
+Scene-change detection for continuous MJPEG camera streams.
+
+For hands-free reading the glasses stream frames continuously instead of
+uploading on a button press. Running OCR on every frame would be wasteful,
+so each frame is decoded at quarter resolution in grayscale and compared
+with its predecessor. OCR is triggered only once the view has changed since
+the last trigger and has then held still for a few frames. Of those still
+frames, the sharpest one is sent on.
+
+Memory is bounded: the splitter holds at most one partial frame and the
+detector keeps a fixed-size ring of recent frames.
+"""
+import os
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+STREAM_CHANGE_THRESHOLD = float(os.environ.get("STREAM_CHANGE_THRESHOLD", "12"))  # mean gray-level difference
+STREAM_STILL_THRESHOLD = float(os.environ.get("STREAM_STILL_THRESHOLD", "4"))
+STREAM_STABLE_FRAMES = int(os.environ.get("STREAM_STABLE_FRAMES", "5"))
+STREAM_MIN_INTERVAL = float(os.environ.get("STREAM_MIN_INTERVAL", "1.5"))  # seconds between triggers
+STREAM_MAX_FRAME_BYTES = int(os.environ.get("STREAM_MAX_FRAME_BYTES", str(1024 * 1024)))
+
+# Frames are compared at this size; enough to see a page move, cheap to diff
+_COMPARE_SIZE = (64, 48)
+
+_JPEG_START = b"\xff\xd8"
+_JPEG_END = b"\xff\xd9"
+
+
+class MJPEGSplitter:
+    """
+    Split a multipart/x-mixed-replace (or bare concatenated) JPEG byte
+    stream into frames. Frames are found by their SOI/EOI markers, so part
+    headers and boundaries need no parsing.
+    """
+
+    def __init__(self, max_frame_bytes=STREAM_MAX_FRAME_BYTES):
+        self.max_frame_bytes = max_frame_bytes
+        self._buffer = bytearray()
+        self.dropped = 0
+
+    def feed(self, chunk):
+        """Add received bytes and return the list of complete frames in them"""
+        self._buffer += chunk
+        frames = []
+        while True:
+            start = self._buffer.find(_JPEG_START)
+            if start < 0:
+                # Keep a trailing 0xFF in case it begins the next marker
+                del self._buffer[:max(0, len(self._buffer) - 1)]
+                break
+            if start:
+                del self._buffer[:start]
+            end = self._buffer.find(_JPEG_END, len(_JPEG_START))
+            if end < 0:
+                if len(self._buffer) > self.max_frame_bytes:
+                    # Corrupt or oversized frame: skip to the next start marker
+                    self.dropped += 1
+                    del self._buffer[:len(_JPEG_START)]
+                    continue
+                break
+            frames.append(bytes(self._buffer[:end + len(_JPEG_END)]))
+            del self._buffer[:end + len(_JPEG_END)]
+        return frames
+
+
+class SceneDetector:
+    """Per-stream state deciding which frames are worth OCR"""
+
+    def __init__(self, change_threshold=STREAM_CHANGE_THRESHOLD, still_threshold=STREAM_STILL_THRESHOLD,
+                 stable_frames=STREAM_STABLE_FRAMES, min_interval=STREAM_MIN_INTERVAL):
+        self.change_threshold = change_threshold
+        self.still_threshold = still_threshold
+        self.stable_frames = max(1, stable_frames)
+        self.min_interval = min_interval
+        self._ring = deque(maxlen=self.stable_frames)  # (sharpness, jpeg) of the current still run
+        self._previous = None   # small frame of the last decoded frame
+        self._reference = None  # small frame of the last triggered scene
+        self._last_trigger = 0.0
+        self.frames = 0
+        self.undecodable = 0
+        self.triggers = 0
+
+    def feed(self, data):
+        """
+        Consider one JPEG frame. Returns the JPEG bytes to OCR when the scene
+        has changed and settled, otherwise None.
+        """
+        self.frames += 1
+        gray = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+        if gray is None:
+            self.undecodable += 1
+            return None
+        small = cv2.resize(gray, _COMPARE_SIZE, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+        previous, self._previous = self._previous, small
+        if previous is None or np.abs(small - previous).mean() > self.still_threshold:
+            # Still moving: start a new still run with this frame
+            self._ring.clear()
+        self._ring.append((float(cv2.Laplacian(gray, cv2.CV_64F).var()), data))
+        if len(self._ring) < self.stable_frames:
+            return None
+
+        now = time.time()
+        if now - self._last_trigger < self.min_interval:
+            return None
+        if self._reference is not None and np.abs(small - self._reference).mean() <= self.change_threshold:
+            # Settled, but on the scene that was already read
+            return None
+
+        self._reference = small
+        self._last_trigger = now
+        self.triggers += 1
+        best = max(self._ring, key=lambda entry: entry[0])[1]
+        self._ring.clear()
+        return best
+
+    def stats(self):
+        return {"frames": self.frames, "undecodable": self.undecodable, "triggers": self.triggers}
@@ -0,0 +1,21 @@
+"""
+Start the glasses server: python serve.py (or python main.py, which hands
+over to this script).
+
+Kept free of server state on purpose. With OCR_EXECUTION=process the OCR
+processes are spawned, and a spawned child re-imports the script that
+started the parent; importing this one costs nothing, whereas main.py
+would rebuild the caches, indexes and shared-state threads in every child.
+"""
+import socket
+
+import uvicorn
+
+if __name__ == "__main__":
+    ip = socket.gethostbyname(socket.gethostname())
+    print(f"📡 Your local IP address: http://{ip}:8000")
+    print("🔍 OCR + TTS Integrated Processing Enabled!")
+    print("📝 Text extraction and audio generation happen automatically in single pipeline")
+    print("⚡ Asynchronous processing enabled - no delays!")
+    print("🎵 Audio files are generated automatically after text extraction")
+    uvicorn.run("main:app", host="0.0.0.0", port=8000)
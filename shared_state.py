@@ -0,0 +1,386 @@
+"""
+Job and result state shared between server processes.
+
+With `uvicorn main:app --workers N`, or several hosts behind a load
+balancer, a result poll can land on a process that never saw the upload.
+A shared backend keeps the authoritative copy of:
+
+- processing results (same API as the stores in result_store)
+- small key/value state such as the latest job per device and the latest
+  audio file
+- an ordered log of result events, which an EventRelay thread in every
+  process replays to that process's SSE/WebSocket/long-poll subscribers
+
+SQLiteSharedBackend works for several worker processes on one machine.
+RedisSharedBackend is an adapter for any client with the redis-py command
+interface, so processes on several hosts can share it. LocalRedisStandIn
+implements the commands the adapter uses in-process, so the adapter can be
+exercised without a Redis server.
+
+Only state is shared, not files: audio and uploaded images are written to
+the disk of the process that handled the job. On one machine every process
+sees the same folders. Several hosts must mount AUDIO_FOLDER and
+UPLOAD_FOLDER from shared storage (NFS, a shared volume) and set
+SHARED_STORAGE=1; otherwise /audio and /latest-audio on one host report
+files made on another as missing, even though the result says completed.
+"""
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+
+from result_store import SQLiteResultStore, decode_cursor, encode_cursor, RESULT_DB_RETENTION
+
+logger = logging.getLogger(__name__)
+
+SHARED_BACKEND = os.environ.get("SHARED_BACKEND", "none")  # "none", "sqlite", "redis" or "redis-local"
+SHARED_DB_PATH = os.environ.get("SHARED_DB_PATH", "shared_state.db")
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+REDIS_PREFIX = os.environ.get("REDIS_PREFIX", "smartglass:")
+# Set once AUDIO_FOLDER and UPLOAD_FOLDER are on storage every host mounts
+SHARED_STORAGE = os.environ.get("SHARED_STORAGE", "0") == "1"
+
+# Result events are only needed until every process has relayed them
+EVENT_RETENTION = 3600  # seconds
+EVENT_POLL_INTERVAL = 0.1  # seconds between SQLite event-log polls
+MAX_STREAM_EVENTS = 10000
+
+
+class SQLiteSharedBackend:
+    """Shared state in one SQLite file, for worker processes on the same machine"""
+
+    PRUNE_EVERY = 500
+
+    def __init__(self, path=SHARED_DB_PATH):
+        self.results = SQLiteResultStore(path)
+        self._published = 0
+        with self.results.connection() as db:
+            db.executescript("""
+                CREATE TABLE IF NOT EXISTS kv (
+                    key        TEXT PRIMARY KEY,
+                    value      TEXT,
+                    updated_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS events (
+                    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+                    filename   TEXT NOT NULL,
+                    state      TEXT,
+                    data       TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS events_created ON events (created_at);
+            """)
+
+    def get_value(self, key):
+        row = self.results.connection().execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_value(self, key, value):
+        self.results.connection().execute(
+            "INSERT INTO kv (key, value, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+            (key, value, time.time()))
+
+    def publish(self, filename, state, result):
+        db = self.results.connection()
+        now = time.time()
+        db.execute("INSERT INTO events (filename, state, data, created_at) VALUES (?, ?, ?, ?)",
+                   (filename, state, json.dumps(result), now))
+        self._published += 1
+        if self._published % self.PRUNE_EVERY == 0:
+            db.execute("DELETE FROM events WHERE created_at < ?", (now - EVENT_RETENTION,))
+
+    def last_event_id(self):
+        row = self.results.connection().execute("SELECT MAX(id) FROM events").fetchone()
+        return row[0] or 0
+
+    def read_events(self, after_id, timeout=1.0):
+        """Return (last_id, [(filename, state, result), ...]) for events after `after_id`, waiting up to `timeout`"""
+        deadline = time.time() + timeout
+        db = self.results.connection()
+        while True:
+            rows = db.execute("SELECT id, filename, state, data FROM events WHERE id > ? ORDER BY id LIMIT 200",
+                              (after_id,)).fetchall()
+            if rows:
+                return rows[-1][0], [(filename, state, json.loads(data)) for _, filename, state, data in rows]
+            if time.time() >= deadline:
+                return after_id, []
+            time.sleep(EVENT_POLL_INTERVAL)
+
+
+class RedisResultStore:
+    """
+    Result store on Redis data structures: one hash of JSON results plus
+    sorted sets (scored by creation time) for the full listing and for each
+    status and device.
+    """
+
+    PURGE_EVERY = 500
+
+    def __init__(self, client, prefix=REDIS_PREFIX, retention=RESULT_DB_RETENTION):
+        self.client = client
+        self.prefix = prefix
+        self.retention = retention
+        self._writes = 0
+
+    def _key(self, *parts):
+        return self.prefix + ":".join(("results",) + parts)
+
+    def get(self, filename):
+        data = self.client.hget(self._key("data"), filename)
+        return json.loads(data) if data else None
+
+    def put(self, filename, result):
+        created = self.client.hget(self._key("created"), filename)
+        created_at = float(created) if created else time.time()
+        previous = self.get(filename) if created else None
+        if previous and previous.get("status") != result.get("status"):
+            self.client.zrem(self._key("status", str(previous.get("status"))), filename)
+        if previous and previous.get("device_id") and previous.get("device_id") != result.get("device_id"):
+            result = dict(result, device_id=previous["device_id"])
+
+        self.client.hset(self._key("data"), filename, json.dumps(result))
+        if not created:
+            self.client.hset(self._key("created"), filename, repr(created_at))
+            self.client.zadd(self._key("all"), {filename: created_at})
+        self.client.zadd(self._key("status", str(result.get("status"))), {filename: created_at})
+        if result.get("device_id"):
+            self.client.zadd(self._key("device", str(result["device_id"])), {filename: created_at})
+
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self._purge()
+        return dict(result)
+
+    def update(self, filename, fields):
+        # Each job is written by the one process running it, so a plain
+        # read-modify-write is sufficient here
+        return self.put(filename, dict(self.get(filename) or {}, **fields))
+
+    def delete(self, filename):
+        result = self.get(filename)
+        self.client.hdel(self._key("data"), filename)
+        self.client.hdel(self._key("created"), filename)
+        self.client.zrem(self._key("all"), filename)
+        if result:
+            self.client.zrem(self._key("status", str(result.get("status"))), filename)
+            if result.get("device_id"):
+                self.client.zrem(self._key("device", str(result["device_id"])), filename)
+
+    def _purge(self):
+        cutoff = time.time() - self.retention
+        for filename in self.client.zrangebyscore(self._key("all"), "-inf", cutoff):
+            self.delete(filename)
+
+    def list(self, status=None, device_id=None, cursor=None, limit=50):
+        if status is not None:
+            index = self._key("status", status)
+        elif device_id is not None:
+            index = self._key("device", device_id)
+        else:
+            index = self._key("all")
+        after = decode_cursor(cursor)
+        upper = after[0] if after else "+inf"
+
+        page = []
+        offset = 0
+        batch = limit + 1
+        while len(page) <= limit:
+            members = self.client.zrevrangebyscore(index, upper, "-inf", start=offset, num=batch, withscores=True)
+            if not members:
+                break
+            offset += len(members)
+            for filename, created_at in members:
+                if after is not None and (created_at, filename) >= after:
+                    continue
+                result = self.get(filename)
+                if result is None:
+                    continue
+                if device_id is not None and result.get("device_id") != device_id:
+                    continue
+                page.append((created_at, filename, result))
+        next_cursor = encode_cursor(page[limit - 1][0], page[limit - 1][1]) if len(page) > limit else None
+        return [(filename, result) for _, filename, result in page[:limit]], next_cursor
+
+    def __contains__(self, filename):
+        return self.client.hget(self._key("data"), filename) is not None
+
+    def __len__(self):
+        return self.client.zcard(self._key("all"))
+
+
+class RedisSharedBackend:
+    """
+    Shared state on a Redis-compatible server (client must decode responses
+    to str). Across hosts, the audio and upload folders need shared storage.
+    """
+
+    def __init__(self, client, prefix=REDIS_PREFIX):
+        self.client = client
+        self.prefix = prefix
+        self.results = RedisResultStore(client, prefix)
+        self._stream = prefix + "events"
+
+    def get_value(self, key):
+        return self.client.get(self.prefix + "kv:" + key)
+
+    def set_value(self, key, value):
+        self.client.set(self.prefix + "kv:" + key, value)
+
+    def publish(self, filename, state, result):
+        self.client.xadd(self._stream, {"filename": filename, "state": str(state), "result": json.dumps(result)},
+                         maxlen=MAX_STREAM_EVENTS, approximate=True)
+
+    def last_event_id(self):
+        entries = self.client.xrevrange(self._stream, count=1)
+        return entries[0][0] if entries else "0-0"
+
+    def read_events(self, after_id, timeout=1.0):
+        response = self.client.xread({self._stream: after_id}, count=200, block=int(timeout * 1000))
+        events = []
+        for _, entries in response or []:
+            for entry_id, fields in entries:
+                after_id = entry_id
+                events.append((fields["filename"], fields["state"], json.loads(fields["result"])))
+        return after_id, events
+
+
+class LocalRedisStandIn:
+    """
+    In-process stand-in for the subset of redis-py commands RedisSharedBackend
+    uses, for development and testing without a Redis server. State is only
+    shared between threads of one process.
+    """
+
+    def __init__(self):
+        self._strings = {}
+        self._hashes = {}
+        self._zsets = {}
+        self._streams = {}
+        self._sequence = 0
+        self._condition = threading.Condition()
+
+    def get(self, key):
+        with self._condition:
+            return self._strings.get(key)
+
+    def set(self, key, value):
+        with self._condition:
+            self._strings[key] = str(value)
+            return True
+
+    def hget(self, name, key):
+        with self._condition:
+            return self._hashes.get(name, {}).get(key)
+
+    def hset(self, name, key, value):
+        with self._condition:
+            self._hashes.setdefault(name, {})[key] = str(value)
+            return 1
+
+    def hdel(self, name, *keys):
+        with self._condition:
+            fields = self._hashes.get(name, {})
+            return sum(1 for key in keys if fields.pop(key, None) is not None)
+
+    def zadd(self, name, mapping):
+        with self._condition:
+            self._zsets.setdefault(name, {}).update({member: float(score) for member, score in mapping.items()})
+            return len(mapping)
+
+    def zrem(self, name, *members):
+        with self._condition:
+            zset = self._zsets.get(name, {})
+            return sum(1 for member in members if zset.pop(member, None) is not None)
+
+    def zcard(self, name):
+        with self._condition:
+            return len(self._zsets.get(name, {}))
+
+    def zrangebyscore(self, name, min, max):
+        low, high = float(min), float(max)
+        with self._condition:
+            items = sorted((score, member) for member, score in self._zsets.get(name, {}).items())
+        return [member for score, member in items if low <= score <= high]
+
+    def zrevrangebyscore(self, name, max, min, start=None, num=None, withscores=False):
+        low, high = float(min), float(max)
+        with self._condition:
+            items = sorted(((score, member) for member, score in self._zsets.get(name, {}).items()), reverse=True)
+        items = [(score, member) for score, member in items if low <= score <= high]
+        if start is not None:
+            items = items[start:start + num if num is not None else None]
+        return [(member, score) for score, member in items] if withscores else [member for _, member in items]
+
+    def xadd(self, name, fields, maxlen=None, approximate=True):
+        with self._condition:
+            self._sequence += 1
+            entry_id = f"{int(time.time() * 1000)}-{self._sequence}"
+            stream = self._streams.setdefault(name, [])
+            stream.append((entry_id, {key: str(value) for key, value in fields.items()}))
+            if maxlen is not None and len(stream) > maxlen:
+                del stream[:len(stream) - maxlen]
+            self._condition.notify_all()
+            return entry_id
+
+    @staticmethod
+    def _id_key(entry_id):
+        milliseconds, _, sequence = entry_id.partition("-")
+        return int(milliseconds), int(sequence or 0)
+
+    def xrevrange(self, name, count=None):
+        with self._condition:
+            entries = list(reversed(self._streams.get(name, [])))
+        return entries[:count] if count is not None else entries
+
+    def xread(self, streams, count=None, block=None):
+        deadline = time.time() + (block or 0) / 1000
+        with self._condition:
+            while True:
+                response = []
+                for name, after_id in streams.items():
+                    stream = self._streams.get(name, [])
+                    keys = [self._id_key(entry_id) for entry_id, _ in stream]
+                    entries = stream[bisect.bisect_right(keys, self._id_key(after_id)):]
+                    if entries:
+                        response.append((name, entries[:count] if count else entries))
+                remaining = deadline - time.time()
+                if response or block is None or remaining <= 0:
+                    return response
+                self._condition.wait(remaining)
+
+
+class EventRelay(threading.Thread):
+    """Replays shared-backend result events to this process's local subscribers"""
+
+    def __init__(self, backend, local_events):
+        super().__init__(name="shared-event-relay", daemon=True)
+        self.backend = backend
+        self.local_events = local_events
+
+    def run(self):
+        last_id = self.backend.last_event_id()
+        while True:
+            try:
+                last_id, events = self.backend.read_events(last_id, timeout=1.0)
+                for filename, state, result in events:
+                    self.local_events.publish(filename, state, result)
+            except Exception as e:
+                logger.error("Shared event relay error: %s", e)
+                time.sleep(1.0)
+
+
+def create_shared_backend(kind=SHARED_BACKEND):
+    """Build the configured shared backend, or None when running as a single process"""
+    if kind == "none":
+        return None
+    if kind == "sqlite":
+        return SQLiteSharedBackend()
+    if kind == "redis":
+        import redis
+        return RedisSharedBackend(redis.Redis.from_url(REDIS_URL, decode_responses=True))
+    if kind == "redis-local":
+        return RedisSharedBackend(LocalRedisStandIn())
+    raise ValueError(f"Unknown shared backend '{kind}', expected 'none', 'sqlite', 'redis' or 'redis-local'")
@@ -0,0 +1,116 @@
+"""
+Stand-in for the Ollama API when testing the spell-check stage.
+
+Answers /api/generate the way the spell-check prompts expect. It flags
+every OCR word in a small list of common misspellings, after an optional
+delay and with an optional failure rate, so concurrency, timeouts and the
+circuit breaker can be exercised without a model:
+
+    python stub_ollama.py --port 11435 --latency 2 --fail-rate 0.2
+    OLLAMA_URL=http://127.0.0.1:11435 python app.py
+
+`start_stub_server` runs the same server on a background thread for use
+from scripts.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MISSPELLINGS = {"teh", "recieve", "adress", "seperate", "definately", "occured", "untill", "wich"}
+
+_OCR_LINE = re.compile(r"Text:\s*(\S+)\s*\(at x:(\d+),\s*y:(\d+)")
+_HEADING = re.compile(r"^\s*###\s*(\w+)\s*$")
+
+
+def stub_response(prompt, misspellings=MISSPELLINGS):
+    """The reply a well-behaved model would give to a spell-check prompt"""
+    batch = "METHOD:" in prompt
+    method = None
+    lines = []
+    for line in prompt.splitlines():
+        heading = _HEADING.match(line)
+        if heading:
+            method = heading.group(1)
+            continue
+        match = _OCR_LINE.search(line)
+        if not match or match.group(1).lower().strip('.,;:!?') not in misspellings:
+            continue
+        word, x, y = match.groups()
+        if batch:
+            lines.append(f"ERROR: {word.strip('.,;:!?')} | METHOD: {method} | COORDINATES: x:{x}, y:{y}")
+        else:
+            lines.append(f"ERROR: {word.strip('.,;:!?')} | COORDINATES: x:{x}, y:{y}")
+    return '\n'.join(lines) or "No spelling errors found."
+
+
+def make_handler(latency=0.0, fail_rate=0.0, seed=None):
+    rng = random.Random(seed)
+
+    class StubOllamaHandler(BaseHTTPRequestHandler):
+        calls = 0
+
+        def _send_json(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/api/tags":
+                self._send_json(200, {"models": [{"name": "stub"}]})
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/api/generate":
+                self._send_json(404, {"error": "not found"})
+                return
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            StubOllamaHandler.calls += 1
+            time.sleep(latency)
+            if rng.random() < fail_rate:
+                self._send_json(500, {"error": "stub failure"})
+                return
+            self._send_json(200, {
+                "model": request.get("model"),
+                "response": stub_response(request.get("prompt", "")),
+                "done": True
+            })
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubOllamaHandler
+
+
+def start_stub_server(port=0, latency=0.0, fail_rate=0.0, seed=None):
+    """Serve the stub on a daemon thread; returns the server (its URL port is server.server_port)"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(latency, fail_rate, seed))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before each reply")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of calls answered with 500")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(args.latency, args.fail_rate, args.seed))
+    print(f"🤖 Stub Ollama listening on http://127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
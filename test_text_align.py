@@ -0,0 +1,35 @@
+from text_align import merge_transcripts, new_words
+
+
+def _words(text, conf):
+    return [{"text": word, "conf": conf} for word in text.split()]
+
+
+SENTENCE = "the quick brown fox jumps over the lazy dog"
+
+
+def test_agreeing_passes_merge_to_one_copy():
+    assert merge_transcripts([_words(SENTENCE, 80), _words(SENTENCE, 70)]) == SENTENCE.split()
+
+
+def test_low_confidence_extra_word_is_dropped():
+    noisy = _words("the quick brown fox jumps zz over the lazy dog", 30)
+    assert merge_transcripts([_words(SENTENCE, 80), _words(SENTENCE, 80), noisy]) == SENTENCE.split()
+
+
+def test_single_word_pass_does_not_vote_out_the_sentence():
+    # PSM 8 reads one word with high confidence; it must not erase the rest
+    psm6 = _words(SENTENCE, 80)
+    psm8 = _words("quick", 92)
+    assert merge_transcripts([psm6, psm8]) == SENTENCE.split()
+
+
+def test_partial_passes_keep_words_outside_their_span():
+    psm6 = _words(SENTENCE, 80)
+    psm8 = _words("quick", 92)
+    psm13 = _words("quick fox jumps the lazy", 70)
+    assert merge_transcripts([psm6, psm8, psm13]) == SENTENCE.split()
+
+
+def test_new_words_skips_text_already_read():
+    assert new_words("the quick brown fox", "brown fox jumps over") == ["jumps", "over"]
@@ -0,0 +1,158 @@
+"""
+Word- and sentence-level helpers for OCR transcripts.
+
+Used to merge the outputs of several Tesseract passes into one consensus
+transcript, so the same sentence recognised by two PSM modes is only spoken
+once, and to find the words of a capture that an earlier one already read.
+"""
+import re
+from difflib import SequenceMatcher
+
+
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+
+
+def split_sentences(text):
+    """Split a transcript into sentences on terminal punctuation"""
+    return [sentence.strip() for sentence in _SENTENCE_BOUNDARY.split(text) if sentence.strip()]
+
+
+def normalize_word(word):
+    """Lower-case a word and strip punctuation for alignment purposes"""
+    normalized = re.sub(r'[^\w]', '', word.lower())
+    return normalized or word.lower()
+
+
+def _mean_confidence(words):
+    confidences = [max(word["conf"], 0.0) for word in words]
+    return sum(confidences) / len(confidences) if confidences else 0.0
+
+
+class _Slot:
+    """One position of the consensus transcript with confidence-weighted votes"""
+
+    def __init__(self, null_weight=0.0):
+        self.votes = {}
+        self.null_weight = null_weight
+
+    def vote(self, word):
+        key = normalize_word(word["text"])
+        weight = max(word["conf"], 0.0)
+        total, best_text, best_conf = self.votes.get(key, (0.0, word["text"], -1.0))
+        if weight > best_conf:
+            best_text, best_conf = word["text"], weight
+        self.votes[key] = (total + weight, best_text, best_conf)
+
+    def winner(self):
+        """Return the winning word, or None when the gap outweighs every candidate"""
+        if not self.votes:
+            return None
+        total, text, _ = max(self.votes.values(), key=lambda vote: vote[0])
+        return text if total > self.null_weight else None
+
+
+def merge_transcripts(candidates):
+    """
+    Merge several OCR word lists into a single consensus word list.
+
+    Each candidate is a list of {"text", "conf"} dicts in reading order (as
+    produced by image_to_data). The most confident candidate is used as the
+    backbone; every other candidate is aligned against it with a sequence
+    matcher and casts confidence-weighted votes for each position. Words a
+    candidate is missing inside the span it aligns to count as a vote for "no
+    word" weighted by that candidate's mean confidence, so text seen by only
+    one low-confidence pass is dropped while text seen by several passes
+    appears exactly once. Positions outside that span get no vote, so a pass
+    that read only part of the frame (PSM 8 reads a single word) does not
+    vote the rest of the sentence away.
+    """
+    candidates = [words for words in candidates if words]
+    if not candidates:
+        return []
+    if len(candidates) == 1:
+        return [word["text"] for word in candidates[0]]
+
+    pivot = max(candidates, key=lambda words: sum(max(word["conf"], 0.0) for word in words))
+    pivot_keys = [normalize_word(word["text"]) for word in pivot]
+    pivot_mean = _mean_confidence(pivot)
+
+    slots = []
+    for word in pivot:
+        slot = _Slot()
+        slot.vote(word)
+        slots.append(slot)
+    # Extra words other candidates place before pivot position i
+    inserts = {i: [] for i in range(len(pivot) + 1)}
+
+    def add_insert(position, word):
+        key = normalize_word(word["text"])
+        for slot in inserts[position]:
+            if key in slot.votes:
+                slot.vote(word)
+                return
+        slot = _Slot(null_weight=pivot_mean)
+        slot.vote(word)
+        inserts[position].append(slot)
+
+    for words in candidates:
+        if words is pivot:
+            continue
+        keys = [normalize_word(word["text"]) for word in words]
+        gap_weight = _mean_confidence(words)
+        opcodes = SequenceMatcher(None, pivot_keys, keys, autojunk=False).get_opcodes()
+        aligned = [(i1, i2) for tag, i1, i2, _, _ in opcodes if tag in ("equal", "replace")] or [(0, 0)]
+        span_start, span_end = aligned[0][0], aligned[-1][1]
+
+        def vote_gap(i):
+            if span_start <= i < span_end:
+                slots[i].null_weight += gap_weight
+
+        for tag, i1, i2, j1, j2 in opcodes:
+            if tag == "equal":
+                for i, j in zip(range(i1, i2), range(j1, j2)):
+                    slots[i].vote(words[j])
+            elif tag == "delete":
+                for i in range(i1, i2):
+                    vote_gap(i)
+            elif tag == "insert":
+                for j in range(j1, j2):
+                    add_insert(i1, words[j])
+            else:  # replace: pair positionally, spill the remainder
+                paired = min(i2 - i1, j2 - j1)
+                for k in range(paired):
+                    slots[i1 + k].vote(words[j1 + k])
+                for i in range(i1 + paired, i2):
+                    vote_gap(i)
+                for j in range(j1 + paired, j2):
+                    add_insert(i2, words[j])
+
+    merged = []
+    for i in range(len(pivot) + 1):
+        for slot in inserts[i]:
+            winner = slot.winner()
+            if winner:
+                merged.append(winner)
+        if i < len(slots):
+            winner = slots[i].winner()
+            if winner:
+                merged.append(winner)
+    return merged
+
+
+def new_words(previous, current, min_match=2):
+    """
+    Words of `current` that are not already in `previous`.
+
+    Both are transcripts; they are aligned word by word with a sequence
+    matcher on normalized words. Only runs of at least `min_match` matching
+    words count as already read, so a lone "the" or "and" is not mistaken
+    for overlap. Returns the remaining words of `current` in order.
+    """
+    old = [normalize_word(word) for word in previous.split()]
+    words = current.split()
+    matcher = SequenceMatcher(None, old, [normalize_word(word) for word in words], autojunk=False)
+    seen = set()
+    for block in matcher.get_matching_blocks():
+        if block.size >= min_match:
+            seen.update(range(block.b, block.b + block.size))
+    return [word for i, word in enumerate(words) if i not in seen]
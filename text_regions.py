@@ -0,0 +1,148 @@
+"""
+Text-line detection for camera frames, using OpenCV only.
+
+Instead of cropping a fixed window out of every frame and handing the rest
+to Tesseract, strong local contrast (the morphological gradient) is
+thresholded and smeared horizontally so the characters of a line fuse into
+one blob. Blob contours that look like text give line bounding boxes, which
+are returned in reading order. A frame without any such blob needs no OCR
+at all.
+
+The same stroke mask, before the lines are joined, splits into one
+connected component per glyph; their median height is the text size.
+"""
+import os
+
+import cv2
+import numpy as np
+
+TEXT_MIN_GRADIENT = int(os.environ.get("TEXT_MIN_GRADIENT", "24"))  # 0-255, below this is sensor noise
+TEXT_MIN_HEIGHT = int(os.environ.get("TEXT_MIN_HEIGHT", "8"))       # pixels
+TEXT_MAX_REGIONS = int(os.environ.get("TEXT_MAX_REGIONS", "40"))
+
+# A text line fills a reasonable share of its box and is not a thin rule
+_MIN_FILL = 0.15
+_MIN_ASPECT = 0.3
+_MAX_HEIGHT_FRACTION = 0.5
+
+# Fewer glyph-like components than this is too little evidence for a text size
+_MIN_GLYPHS = 5
+# The 3x3 gradient outlines each glyph one pixel beyond its edge on both sides
+_GRADIENT_GROWTH = 2
+
+
+def _text_mask(gray):
+    """Binary mask of high-contrast strokes with each line's characters joined"""
+    ellipse = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+    gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, ellipse)
+    threshold, strokes = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    if threshold < TEXT_MIN_GRADIENT:
+        # Otsu splits any histogram in two; on a blank frame that is noise
+        _, strokes = cv2.threshold(gradient, TEXT_MIN_GRADIENT, 255, cv2.THRESH_BINARY)
+
+    # Join characters of a line (gaps scale with frame width) but not lines
+    join = cv2.getStructuringElement(cv2.MORPH_RECT, (max(9, gray.shape[1] // 80), 1))
+    lines = cv2.morphologyEx(strokes, cv2.MORPH_CLOSE, join)
+    return strokes, lines
+
+
+def _is_text_like(strokes, box, frame_height):
+    x, y, w, h = box
+    if h < TEXT_MIN_HEIGHT or h > frame_height * _MAX_HEIGHT_FRACTION:
+        return False
+    if w < h * _MIN_ASPECT:
+        return False
+    fill = cv2.countNonZero(strokes[y:y + h, x:x + w]) / float(w * h)
+    return fill >= _MIN_FILL
+
+
+def _pad(box, shape):
+    """Grow a box by a fraction of its height so ascenders and descenders survive"""
+    x, y, w, h = box
+    margin = max(2, h // 4)
+    x0, y0 = max(0, x - margin), max(0, y - margin)
+    x1, y1 = min(shape[1], x + w + margin), min(shape[0], y + h + margin)
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def _overlaps(a, b):
+    return (a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and
+            a[1] < b[1] + b[3] and b[1] < a[1] + a[3])
+
+
+def _union(a, b):
+    x0, y0 = min(a[0], b[0]), min(a[1], b[1])
+    x1, y1 = max(a[0] + a[2], b[0] + b[2]), max(a[1] + a[3], b[1] + b[3])
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def _merge_overlapping(boxes):
+    """Union boxes that overlap after padding, until none do"""
+    merged = True
+    while merged:
+        merged = False
+        result = []
+        for box in boxes:
+            for i, other in enumerate(result):
+                if _overlaps(box, other):
+                    result[i] = _union(box, other)
+                    merged = True
+                    break
+            else:
+                result.append(box)
+        boxes = result
+    return boxes
+
+
+def reading_order(boxes):
+    """Sort boxes top to bottom into rows, then left to right within a row"""
+    rows = []
+    for box in sorted(boxes, key=lambda b: b[1]):
+        center = box[1] + box[3] / 2.0
+        row = rows[-1] if rows else None
+        # Same row if this box's vertical center lies within the row's first box
+        if row and row[0][1] <= center <= row[0][1] + row[0][3]:
+            row.append(box)
+        else:
+            rows.append([box])
+    return [box for row in rows for box in sorted(row, key=lambda b: b[0])]
+
+
+def detect_text_regions(gray):
+    """
+    Find text-line bounding boxes (x, y, w, h) in a grayscale frame, in
+    reading order. Tightly spaced lines whose padded boxes touch come back
+    as one paragraph box. Returns an empty list for frames without text.
+    """
+    strokes, lines = _text_mask(gray)
+    contours, _ = cv2.findContours(lines, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    boxes = [cv2.boundingRect(contour) for contour in contours]
+    boxes = [_pad(box, gray.shape) for box in boxes if _is_text_like(strokes, box, gray.shape[0])]
+    return reading_order(_merge_overlapping(boxes))
+
+
+def estimate_text_height(gray):
+    """
+    Dominant character height in pixels of a grayscale image, from the
+    median height of glyph-sized connected components. Returns None when
+    there are too few glyphs to tell.
+    """
+    strokes, _ = _text_mask(gray)
+    _, _, stats, _ = cv2.connectedComponentsWithStats(strokes, connectivity=8)
+    # Row 0 is the background; glyphs are neither specks, rules nor whole lines
+    heights = [
+        h for _, _, w, h, area in stats[1:]
+        if TEXT_MIN_HEIGHT // 2 <= h <= gray.shape[0] * _MAX_HEIGHT_FRACTION and w <= 3 * h and area >= h
+    ]
+    if len(heights) < _MIN_GLYPHS:
+        return None
+    return max(1.0, float(np.median(heights)) - _GRADIENT_GROWTH)
+
+
+def bounding_box(boxes):
+    """Smallest box containing every box"""
+    x0 = min(box[0] for box in boxes)
+    y0 = min(box[1] for box in boxes)
+    x1 = max(box[0] + box[2] for box in boxes)
+    y1 = max(box[1] + box[3] for box in boxes)
+    return x0, y0, x1 - x0, y1 - y0